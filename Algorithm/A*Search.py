@@ -1,3 +1,6 @@
+from Graph import CSRGraph, can_reach
+
+
 class Node:
     """
     This class describes a single node contained within a graph. 
@@ -71,56 +74,332 @@ def build_graph():
     
     
 import heapq
+import time
 
 def heuristic_cost_f(path_cost, h):
     # g(n) + h(n)
     return path_cost + h
 
-def a_star_search(starting_node, goal_node):
+def id_graph(starting_node, graph=None):
+    """
+    Gives the searches one view of both kinds of graph, where nodes are integer ids
+
+    Parameters:
+    - starting_node: The entry node into the graph, its integer ID if graph is given
+    - graph: A CSRGraph, or None to walk the Node objects from starting_node
+
+    Returns:
+    (start id, edges, heuristic) where edges(id) lists the (target id, cost) of the
+    edges leaving a node and heuristic(id) is its h(n), 0 on a CSRGraph without one
+    """
+    if graph is not None:
+      h_values = None if graph.heuristic is None else graph.heuristic.tolist()
+      heuristic = (lambda ID: 0.0) if h_values is None else h_values.__getitem__
+      return starting_node, graph.edges, heuristic
+
+    # the Node objects are found as they are reached, so the graph is never walked up front
+    nodes = {starting_node.ID: starting_node}
+
+    def edges(ID):
+      node_edges = []
+      for cost, cNode in nodes[ID].connected_nodes:
+        nodes[cNode.ID] = cNode
+        node_edges.append((cNode.ID, cost))
+      return node_edges
+
+    def heuristic(ID):
+      return nodes[ID].heuristic_cost
+
+    return starting_node.ID, edges, heuristic
+
+def reconstruct_path(parents, node):
+    """
+    Follows the parent pointers from node back to the start, returns the ids from the start to node
+    """
+    path = [node]
+    while parents[node] is not None:
+      node = parents[node]
+      path.append(node)
+    path.reverse()
+    return path
+
+def a_star_search(starting_node, goal_node, graph=None, return_path=False):
     """
     This function implements the A* search algorithm
 
     Parameters:
     - starting_node: The entry node into the graph
     - goal_node: The integer ID of the goal node.
+    - graph: A CSRGraph with a heuristic to search instead of Node objects,
+             starting_node is then the integer ID of the entry node
+    - return_path: Whether to also return the cheapest path to the goal node
 
     Returns:
     A list containing the visited node ids in order they were visited with starting node
-    always being the first node and the goal node always being the last
+    always being the first node and the goal node always being the last.
+    With return_path, a tuple of that list and the ids on the cheapest path from the
+    starting node to the goal node, or None if the goal node cannot be reached
     """
 
     visited_nodes_in_order = []
-    store_item_to_check_frontier = []
-    node = starting_node
-    frontier = [(node.heuristic_cost, node.ID, node.connected_nodes)] # the priority queue 
-    store_item_to_check_frontier = [node.ID] # to check if the item is in frontier or not
-    heapq.heapify(frontier)
+    start, edges, heuristic = id_graph(starting_node, graph)
+
+    # g(n), the cost of the cheapest path found so far to every reached node
+    g_score = {start: 0.0}
+    parents = {start: None}
+    # the nodes that have been expanded with their cheapest g(n)
+    closed = set()
+    # the priority queue holds (f(n), h(n), id, g(n)), so ties on f(n) go to the node
+    # closest to the goal. When a cheaper path to a node is found it is pushed again,
+    # and the old entry is dropped when it is popped (lazy deletion)
+    start_h = heuristic(start)
+    frontier = [(heuristic_cost_f(0.0, start_h), start_h, start, 0.0)]
 
     # while the frontier is not empty
     while frontier:
-      # poping the shallowest node in the frontier list
-      popped_elem = heapq.heappop(frontier)
-      visited_nodes_in_order.append(popped_elem[1])
+      # poping the node with the lowest f(n) in the frontier
+      f, h, ID, g = heapq.heappop(frontier)
+      if ID in closed or g > g_score[ID]:
+        continue
+      closed.add(ID)
+      visited_nodes_in_order.append(ID)
 
-      # if the popped node is the goal node, return the visited_nodes_in_order list
-      if popped_elem[1] == goal_node:   
+      # if the popped node is the goal node, its g(n) is the cheapest path cost
+      if ID == goal_node:
+        if return_path:
+          return visited_nodes_in_order, reconstruct_path(parents, ID)
         return visited_nodes_in_order
 
-      # loop through the popped_elem's connected nodes
-      for connected_node in popped_elem[2]:
-        cNode = connected_node[1] 
-        new_path_cost = heuristic_cost_f(connected_node[0], cNode.heuristic_cost) 
-        # check if the connected node is in visited_nodes_in_order
-        if (cNode.ID not in visited_nodes_in_order) or (cNode.ID not in store_item_to_check_frontier):
-          heapq.heappush(frontier, (new_path_cost, cNode.ID, cNode.connected_nodes))
-          store_item_to_check_frontier.append(cNode.ID)
+      # loop through the popped node's edges
+      for cNode, cost in edges(ID):
+        new_g = g + cost
+        if new_g < g_score.get(cNode, float('inf')):
+          g_score[cNode] = new_g
+          parents[cNode] = ID
+          # a closed node is only reached more cheaply when h(n) is not consistent,
+          # it is then opened again
+          closed.discard(cNode)
+          cNode_h = heuristic(cNode)
+          heapq.heappush(frontier, (heuristic_cost_f(new_g, cNode_h), cNode_h, cNode, new_g))
 
+    if return_path:
+      return visited_nodes_in_order, None
     return visited_nodes_in_order
-    
-    raise NotImplementedError()
+
+def mm_priority(g, h):
+    # max(g(n) + h(n), 2 g(n)), the priority of MM, which makes both searches meet in the middle
+    return max(heuristic_cost_f(g, h), 2 * g)
+
+def bidirectional_a_star_search(starting_node, goal_node, graph, return_path=False):
+    """
+    This function implements the MM bidirectional heuristic search (Holte et al. 2016),
+    an A* forward from the starting node and one backward from the goal node over the
+    reversed edges. The backward search estimates the cost from the starting node to n
+    as max(0, h(start) - h(n)), which never overestimates when h(n) is consistent
+
+    Parameters:
+    - starting_node: The integer ID of the entry node
+    - goal_node: The integer ID of the goal node.
+    - graph: The CSRGraph to search
+    - return_path: Whether to also return the cheapest path to the goal node
+
+    Returns:
+    A list containing the visited node ids: the nodes visited forward in order, then the
+    nodes visited only backward, ending with the goal node. With return_path, a tuple of
+    that list and the ids on the cheapest path. If the goal node cannot be reached, the
+    same as a_star_search
+    """
+    if starting_node == goal_node or not 0 <= goal_node < graph.num_nodes:
+      return a_star_search(starting_node, goal_node, graph, return_path)
+
+    # h(n) is read from the array node by node, so nothing is done per search for every node of the graph
+    h_values = graph.heuristic
+    if h_values is None:
+      forward_heuristic = lambda ID: 0.0
+    else:
+      forward_heuristic = lambda ID: float(h_values[ID])
+    start_h = forward_heuristic(starting_node)
+    backward_heuristic = lambda ID: max(0.0, start_h - forward_heuristic(ID))
+
+    # each side keeps (edges, heuristic, g(n), parents, closed set, priority queue, visited ids in order),
+    # the backward side walks the reversed edges, built once per graph
+    sides = []
+    for start, edges, heuristic in ((starting_node, graph.edges, forward_heuristic),
+                                    (goal_node, graph.reverse().edges, backward_heuristic)):
+      h = heuristic(start)
+      sides.append((edges, heuristic, {start: 0.0}, {start: None}, set(),
+                    [(mm_priority(0.0, h), h, start, 0.0)], []))
+    forward, backward = sides
+
+    # the cost of the cheapest path found so far, and the node where its two halves meet
+    best_cost = float('inf')
+    meeting_node = None
+
+    while True:
+      # the stale entries are dropped first, so the heads of the queues are open nodes
+      for side in sides:
+        g_score, closed, frontier = side[2], side[4], side[5]
+        while frontier and (frontier[0][2] in closed or frontier[0][3] > g_score[frontier[0][2]]):
+          heapq.heappop(frontier)
+      if not forward[5] or not backward[5]:
+        break
+      # no path through a node that is still open is cheaper than the lower of the two
+      # priorities, so the best path found so far is the cheapest once it is that cheap
+      if best_cost <= min(forward[5][0][0], backward[5][0][0]):
+        break
+
+      side, other = (forward, backward) if forward[5][0][0] <= backward[5][0][0] else (backward, forward)
+      edges, heuristic, g_score, parents, closed, frontier, visited_in_order = side
+      other_g_score = other[2]
+      priority, h, ID, g = heapq.heappop(frontier)
+      closed.add(ID)
+      visited_in_order.append(ID)
+
+      for cNode, cost in edges(ID):
+        new_g = g + cost
+        if new_g < g_score.get(cNode, float('inf')):
+          g_score[cNode] = new_g
+          parents[cNode] = ID
+          closed.discard(cNode)
+          cNode_h = heuristic(cNode)
+          heapq.heappush(frontier, (mm_priority(new_g, cNode_h), cNode_h, cNode, new_g))
+          # the two searches meet at cNode
+          if cNode in other_g_score and new_g + other_g_score[cNode] < best_cost:
+            best_cost = new_g + other_g_score[cNode]
+            meeting_node = cNode
+
+    if meeting_node is None:
+      return a_star_search(starting_node, goal_node, graph, return_path)
+
+    visited_nodes_in_order = forward[6]
+    visited_forward = set(visited_nodes_in_order)
+    visited_nodes_in_order.extend(ID for ID in reversed(backward[6]) if ID not in visited_forward)
+    if goal_node in visited_forward:
+      # the forward search reached the goal node itself, which is kept last
+      visited_nodes_in_order.remove(goal_node)
+      visited_nodes_in_order.append(goal_node)
+    if return_path:
+      path = reconstruct_path(forward[3], meeting_node)
+      path.extend(reversed(reconstruct_path(backward[3], meeting_node)[:-1]))
+      return visited_nodes_in_order, path
+    return visited_nodes_in_order
+
+def ida_star_search(starting_node, goal_node, graph=None, cache_size=0):
+    """
+    This function implements iterative deepening A* (IDA*), which repeats a depth first
+    search that skips every node whose f(n) = g(n) + h(n) is above a bound, starting at
+    h(n) of the starting node and raised to the lowest f(n) skipped each time. Only the
+    current path is kept, so memory grows with the depth of the goal and not the graph.
+    The goal is first checked to be reachable, since otherwise the bound keeps rising
+    until every path without a cycle has been walked
+
+    Parameters:
+    - starting_node: The entry node into the graph
+    - goal_node: The integer ID of the goal node.
+    - graph: A CSRGraph with a heuristic to search instead of Node objects,
+             starting_node is then the integer ID of the entry node
+    - cache_size: The number of nodes whose cheapest g(n) in the current iteration is
+                  remembered, so a node reached again no cheaper is not explored twice.
+                  0 only avoids cycles
+
+    Returns:
+    A tuple of the ids on the cheapest path from the starting node to the goal node,
+    or None if it cannot be reached, and a list with the number of nodes expanded by
+    every iteration
+    """
+    # the nodes are walked as they are, nothing is kept for every node of the graph
+    if graph is not None:
+      h_values = graph.heuristic
+      heuristic = (lambda ID: 0.0) if h_values is None else (lambda ID: float(h_values[ID]))
+      edges = graph.edges
+      node_id = lambda ID: ID
+    else:
+      heuristic = lambda node: node.heuristic_cost
+      edges = lambda node: ((cNode, cost) for cost, cNode in node.connected_nodes)
+      node_id = lambda node: node.ID
+    nodes_expanded_per_iteration = []
+    if not can_reach(starting_node, goal_node, graph):
+      return None, nodes_expanded_per_iteration
+    bound = heuristic_cost_f(0.0, heuristic(starting_node))
+
+    while True:
+      nodes_expanded = 0
+      # the lowest f(n) above the bound, which becomes the next bound
+      next_bound = float('inf')
+      cache = {}
+      # the current path, with g(n) and an iterator over the edges still to explore of every node on it
+      path = []
+      path_g = []
+      on_path = set()
+      children = []
+      candidate = (starting_node, 0.0)
+
+      while True:
+        if candidate is not None:
+          node, g = candidate
+          candidate = None
+          f = heuristic_cost_f(g, heuristic(node))
+          if f > bound:
+            next_bound = min(next_bound, f)
+          elif node_id(node) == goal_node:
+            path.append(node)
+            nodes_expanded_per_iteration.append(nodes_expanded)
+            return [node_id(node) for node in path], nodes_expanded_per_iteration
+          elif node not in on_path and cache.get(node, float('inf')) > g:
+            if node in cache or len(cache) < cache_size:
+              cache[node] = g
+            nodes_expanded += 1
+            path.append(node)
+            path_g.append(g)
+            on_path.add(node)
+            children.append(iter(edges(node)))
+        if not children:
+          break
+        edge = next(children[-1], None)
+        if edge is None:
+          # every edge of the last node on the path has been explored
+          on_path.discard(path.pop())
+          path_g.pop()
+          children.pop()
+        else:
+          candidate = (edge[0], path_g[-1] + edge[1])
+
+      nodes_expanded_per_iteration.append(nodes_expanded)
+      if next_bound == float('inf'):
+        # nothing was skipped, so every reachable node was explored
+        return None, nodes_expanded_per_iteration
+      bound = next_bound
 
 goal_node = 12
 
 a_star_search_answer = [0, 2, 6, 10, 12]
 
 assert a_star_search(build_graph(), goal_node)==a_star_search_answer
+
+assert a_star_search(0, goal_node, CSRGraph.from_nodes(build_graph()))==a_star_search_answer
+
+# the cheapest path is the visit order here, since A* never leaves it
+assert a_star_search(build_graph(), goal_node, return_path=True)==(a_star_search_answer, a_star_search_answer)
+
+# the searches meet at 10, which neither of them expands
+bidirectional_a_star_search_answer = [0, 2, 6, 12]
+
+assert bidirectional_a_star_search(0, goal_node, CSRGraph.from_nodes(build_graph()), return_path=True)==(bidirectional_a_star_search_answer, a_star_search_answer)
+
+# h(n) of node 0 is 7, the cost of the cheapest path, so the first bound already reaches the goal
+assert ida_star_search(build_graph(), goal_node)==(a_star_search_answer, [4])
+
+assert ida_star_search(0, goal_node, CSRGraph.from_nodes(build_graph()), cache_size=16)==(a_star_search_answer, [4])
+
+# every node of the first 20 leads to every other one and none to the goal 20, so without
+# the reachability check the search would walk all of the countless paths between them
+complete_graph = CSRGraph.from_edges(21, [u for u in range(20) for v in range(20) if u != v],
+                                     [v for u in range(20) for v in range(20) if u != v], [1.0] * 380, [0.0] * 21)
+
+start = time.perf_counter()
+
+assert ida_star_search(0, 20, complete_graph)==(None, [])
+
+assert ida_star_search(complete_graph.to_nodes(Node)[0], 20)==(None, [])
+
+assert time.perf_counter() - start < 1
@@ -1,3 +1,9 @@
+import time
+from collections import deque
+
+from Graph import CSRGraph, can_reach
+
+
 class Node:
     """
     This class describes a single node contained within a graph. 
@@ -65,79 +71,123 @@ def build_graph():
     
     return all_nodes
  
-def BFS(starting_node, goal_node):
+def BFS(starting_node, goal_node, graph=None):
     """
     This function implements the breath first search algorithm
     
     Parameters:
     - starting_node: The entry node into the graph
     - goal_node: The integer ID of the goal node.
+    - graph: A CSRGraph to search instead of Node objects, starting_node is
+             then the integer ID of the entry node
     
     Returns:
     A list containing the visited nodes in order they were visited with starting node
     always being the first node and the goal node always being the last
+    (their integer IDs when searching a CSRGraph)
     """
     visited_nodes_in_order = []
+    if graph is not None:
+      # the same search over integer ids, the edges are read from the CSR arrays
+      # and the reached nodes are marked in a byte per node
+      reached = bytearray(graph.num_nodes)
+      reached[starting_node] = 1
+      frontier = deque([starting_node])
+      while frontier:
+        popped_elem = frontier.popleft()
+        visited_nodes_in_order.append(popped_elem)
+        if popped_elem == goal_node:
+          return visited_nodes_in_order
+        for cNode in graph.neighbors(popped_elem):
+          if not reached[cNode]:
+            reached[cNode] = 1
+            frontier.append(cNode)
+      return visited_nodes_in_order
+
     # YOUR CODE HERE
     node = starting_node
-    frontier = [node] # a FIFO queue with node as the only element
-    
-    if starting_node == goal_node:
-      visited_nodes_in_order.append(node.ID)
+    frontier = deque([node]) # a FIFO queue with node as the only element
+    # the nodes that have been put in the frontier, a node is visited in the order
+    # it was first put there, so it never has to be put there twice
+    reached = {node}
 
     # while the frontier is not empty
     while frontier:
-      # poping the shallowest node in the frontier list
-      popped_elem = frontier.pop(0)
+      # poping the shallowest node in the frontier
+      popped_elem = frontier.popleft()
+      # adding the popped node to the visited_nodes_in_order list
+      visited_nodes_in_order.append(popped_elem)
       # if the popped node is the goal node, return the visited_nodes_in_order list
       if popped_elem.ID == goal_node: 
-        visited_nodes_in_order.append(popped_elem)
         return visited_nodes_in_order
-      if popped_elem not in visited_nodes_in_order:
-        # adding the popped node to the visited_nodes_in_order list
-        visited_nodes_in_order.append(popped_elem) 
-        # loop through the popped_elem's connected nodes
-        for connected_node in popped_elem.connected_nodes:
-          cNode = connected_node[1]
-          # check if the connected node is in visited_nodes_in_order
-          if cNode not in visited_nodes_in_order:
-            frontier.append(cNode)
+      # loop through the popped_elem's connected nodes
+      for connected_node in popped_elem.connected_nodes:
+        cNode = connected_node[1]
+        # check if the connected node has been reached already
+        if cNode not in reached:
+          reached.add(cNode)
+          frontier.append(cNode)
   
     return visited_nodes_in_order
   
     raise NotImplementedError()
 
-def DFS(starting_node, goal_node):
+def DFS(starting_node, goal_node, graph=None):
     """
     This function implements the depth first search algorithm
     
     Parameters:
     - starting_node: The entry node into the graph
     - goal_node: The integer ID of the goal node.
+    - graph: A CSRGraph to search instead of Node objects, starting_node is
+             then the integer ID of the entry node
     
     Returns:
     A list containing the visited nodes in order they were visited with starting node
     always being the first node and the goal node always being the last
+    (their integer IDs when searching a CSRGraph)
     """
     visited_nodes_in_order = []
+    if graph is not None:
+      # the same search over integer ids, the edges are read from the CSR arrays
+      # and the visited nodes are marked in a byte per node
+      visited = bytearray(graph.num_nodes)
+      frontier = [starting_node]
+      while frontier:
+        popped_elem = frontier.pop()
+        if visited[popped_elem]:
+          continue
+        visited[popped_elem] = 1
+        visited_nodes_in_order.append(popped_elem)
+        for cNode in graph.neighbors(popped_elem):
+          if not visited[cNode]:
+            if cNode == goal_node:
+              visited_nodes_in_order.append(cNode)
+              return visited_nodes_in_order
+            frontier.append(cNode)
+      return visited_nodes_in_order
+
     # YOUR CODE HERE
     node = starting_node
     frontier = [node] # a LIFO queue with node as the only element
-    
-    if starting_node == goal_node:
-      visited_nodes_in_order.append(node.ID)
+    # the same nodes as visited_nodes_in_order, to look them up in O(1)
+    visited = set()
 
     # while the frontier is not empty
     while frontier:
       # poping the last node in the frontier list
       popped_elem = frontier.pop()
+      # a node reached along two paths is in the frontier twice, but is only explored once
+      if popped_elem in visited:
+        continue
       # adding the popped node to the explored list
+      visited.add(popped_elem)
       visited_nodes_in_order.append(popped_elem) 
       # loop through the popped_elem's connected nodes
       for connected_node in popped_elem.connected_nodes:
         cNode = connected_node[1]
         # check if the connected node is in explored
-        if cNode not in visited_nodes_in_order:
+        if cNode not in visited:
           # if the connected node is the goal node, return the explored list
           if cNode.ID == goal_node:
             visited_nodes_in_order.append(cNode)
@@ -148,6 +198,161 @@ def DFS(starting_node, goal_node):
     return visited_nodes_in_order
   
     raise NotImplementedError()
+
+def bidirectional_BFS(starting_node, goal_node, graph):
+    """
+    This function implements breath first search forward from the starting node and
+    backward from the goal node at once, always expanding the side with the smaller frontier
+
+    Parameters:
+    - starting_node: The integer ID of the entry node
+    - goal_node: The integer ID of the goal node.
+    - graph: The CSRGraph to search
+
+    Returns:
+    A list containing the visited node ids: the nodes visited forward in order, the node
+    where the searches met, then the nodes visited backward, ending with the goal node.
+    If the goal node cannot be reached, the same list as BFS
+    """
+    if starting_node == goal_node:
+      return [starting_node]
+    if not 0 <= goal_node < graph.num_nodes:
+      return BFS(starting_node, goal_node, graph)
+
+    # each side keeps (graph, frontier, parent of every reached node, visited nodes in order),
+    # the backward side walks the reversed edges, built once per graph. The visited nodes
+    # are the keys of a dict, which keeps their order and finds the meeting node at once
+    forward = (graph, deque([starting_node]), {starting_node: None}, {})
+    backward = (graph.reverse(), deque([goal_node]), {goal_node: None}, {})
+    meeting_node = None
+
+    while forward[1] and backward[1] and meeting_node is None:
+      # a whole layer of the side with the smaller frontier is expanded. A node reached
+      # by both sides is found when the second side reaches it, so every node found
+      # in the same layer lies on a shortest path and the first one is taken
+      if len(forward[1]) <= len(backward[1]):
+        side_graph, frontier, reached, visited_in_order = forward
+        other_reached = backward[2]
+      else:
+        side_graph, frontier, reached, visited_in_order = backward
+        other_reached = forward[2]
+      for _ in range(len(frontier)):
+        popped_elem = frontier.popleft()
+        visited_in_order[popped_elem] = None
+        for cNode in side_graph.neighbors(popped_elem):
+          if cNode not in reached:
+            reached[cNode] = popped_elem
+            frontier.append(cNode)
+            if cNode in other_reached:
+              meeting_node = cNode
+              break
+        if meeting_node is not None:
+          break
+
+    if meeting_node is None:
+      return BFS(starting_node, goal_node, graph)
+    visited_nodes_in_order = list(forward[3])
+    if meeting_node not in forward[3] and meeting_node not in backward[3]:
+      visited_nodes_in_order.append(meeting_node)
+    visited_nodes_in_order.extend(reversed(backward[3]))
+    return visited_nodes_in_order
+
+def depth_limited_DFS(starting_node, goal_node, depth_limit, graph=None, cache_size=0):
+    """
+    This function implements depth first search that goes at most depth_limit edges deep.
+    Nodes are explored in the same order as DFS, but only the current path is kept
+    instead of every visited node, so memory grows with the depth and not the graph
+
+    Parameters:
+    - starting_node: The entry node into the graph
+    - goal_node: The integer ID of the goal node.
+    - depth_limit: The number of edges the search may follow from the starting node
+    - graph: A CSRGraph to search instead of Node objects, starting_node is
+             then the integer ID of the entry node
+    - cache_size: The number of nodes whose shallowest depth is remembered, so a node
+                  reached again no shallower is not explored twice. 0 only avoids cycles
+
+    Returns:
+    A tuple of the path from the starting node to the goal node, or None if it was
+    not found, the number of nodes expanded, and whether any node was left
+    unexplored because of the depth limit
+    """
+    if graph is not None:
+      children_of = lambda ID: reversed(graph.neighbors(ID))
+      node_id = lambda ID: ID
+    else:
+      # reversed, so the last connected node is explored first like in DFS
+      children_of = lambda node: reversed([connected_node[1] for connected_node in node.connected_nodes])
+      node_id = lambda node: node.ID
+
+    nodes_expanded = 0
+    cutoff = False
+    # the shallowest depth every remembered node was reached at
+    cache = {}
+    # the current path, with an iterator over the children still to explore of every node on it
+    path = []
+    on_path = set()
+    children = []
+    candidate = starting_node
+
+    while True:
+      if candidate is not None:
+        node = candidate
+        candidate = None
+        depth = len(path)
+        if node_id(node) == goal_node:
+          path.append(node)
+          return path, nodes_expanded, cutoff
+        if node not in on_path and cache.get(node, depth + 1) > depth:
+          if depth == depth_limit:
+            cutoff = True
+          else:
+            if node in cache or len(cache) < cache_size:
+              cache[node] = depth
+            nodes_expanded += 1
+            path.append(node)
+            on_path.add(node)
+            children.append(iter(children_of(node)))
+      if not children:
+        return None, nodes_expanded, cutoff
+      candidate = next(children[-1], None)
+      if candidate is None:
+        # every child of the last node on the path has been explored
+        on_path.discard(path.pop())
+        children.pop()
+
+def iterative_deepening_DFS(starting_node, goal_node, graph=None, max_depth=None, cache_size=0):
+    """
+    This function implements iterative deepening depth first search, which repeats
+    depth_limited_DFS with a limit of 0, 1, 2, ... edges. It finds a path with the fewest
+    edges like BFS, with memory that grows with the depth of the goal like DFS.
+    The goal is first checked to be reachable, since otherwise the limit keeps rising
+    until every path without a cycle has been walked
+
+    Parameters:
+    - starting_node: The entry node into the graph
+    - goal_node: The integer ID of the goal node.
+    - graph: A CSRGraph to search instead of Node objects, starting_node is
+             then the integer ID of the entry node
+    - max_depth: The deepest limit to try, or None to go on until the whole graph is explored
+    - cache_size: Passed to depth_limited_DFS
+
+    Returns:
+    A tuple of the path from the starting node to the goal node, or None if it was
+    not found, and a list with the number of nodes expanded by every iteration
+    """
+    nodes_expanded_per_iteration = []
+    if not can_reach(starting_node, goal_node, graph):
+      return None, nodes_expanded_per_iteration
+    depth_limit = 0
+    while max_depth is None or depth_limit <= max_depth:
+      path, nodes_expanded, cutoff = depth_limited_DFS(starting_node, goal_node, depth_limit, graph, cache_size)
+      nodes_expanded_per_iteration.append(nodes_expanded)
+      # without a cutoff the last iteration explored every reachable node
+      if path is not None or not cutoff:
+        return path, nodes_expanded_per_iteration
+      depth_limit += 1
+    return None, nodes_expanded_per_iteration
     
     
 goal_node = 12
@@ -156,6 +361,44 @@ print(BFS(build_graph()[0], goal_node))
 
 print(DFS(build_graph()[0], goal_node))
 
+BFS_answer = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12]
+
+DFS_answer = [0, 3, 7, 11, 2, 6, 10, 12]
+
+# forward 0, then backward 12, 8, 10 and 5, which meets the forward search at 1
+bidirectional_BFS_answer = [0, 1, 5, 10, 8, 12]
+
+assert [node.ID for node in BFS(build_graph()[0], goal_node)]==BFS_answer
+
+assert [node.ID for node in DFS(build_graph()[0], goal_node)]==DFS_answer
+
+# the same searches on the CSR form of the graph, which visit the same node ids
+csr_graph = CSRGraph.from_nodes(build_graph())
+
+assert BFS(0, goal_node, csr_graph)==BFS_answer
+
+assert DFS(0, goal_node, csr_graph)==DFS_answer
+
+assert bidirectional_BFS(0, goal_node, csr_graph)==bidirectional_BFS_answer
+
+# 12 is 4 edges deep, the iteration with limit 4 finds it
+assert iterative_deepening_DFS(0, goal_node, csr_graph)==([0, 2, 6, 10, 12], [0, 1, 4, 9, 7])
+
+assert [node.ID for node in iterative_deepening_DFS(build_graph()[0], goal_node)[0]]==[0, 2, 6, 10, 12]
+
+# every node of the first 20 leads to every other one and none to the goal 20, so without
+# the reachability check the search would walk all of the countless paths between them
+complete_graph = CSRGraph.from_edges(21, [u for u in range(20) for v in range(20) if u != v],
+                                     [v for u in range(20) for v in range(20) if u != v], [1.0] * 380)
+
+start = time.perf_counter()
+
+assert iterative_deepening_DFS(0, 20, complete_graph)==(None, [])
+
+assert iterative_deepening_DFS(complete_graph.to_nodes(Node)[0], 20)==(None, [])
+
+assert time.perf_counter() - start < 1
+
 
 '''
 Output:
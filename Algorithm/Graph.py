@@ -0,0 +1,176 @@
+import numpy as np
+
+
+def reachable_nodes(nodes):
+    """
+    Finds every Node reachable from nodes
+
+    Parameters:
+    - nodes: A Node or a list of Nodes
+
+    Returns: A dict from the integer ID of every reachable node to the Node
+    """
+    stack = list(nodes) if isinstance(nodes, (list, tuple)) else [nodes]
+    found = {}
+    while stack:
+        node = stack.pop()
+        if node.ID in found:
+            continue
+        found[node.ID] = node
+        for cost, connected_node in node.connected_nodes:
+            stack.append(connected_node)
+    return found
+
+
+def can_reach(starting_node, goal_node, graph=None):
+    """
+    Checks if the goal node is reachable, walking every node at most once
+
+    Parameters:
+    - starting_node: The entry node into the graph
+    - goal_node: The integer ID of the goal node.
+    - graph: A CSRGraph to walk instead of Node objects, starting_node is
+             then the integer ID of the entry node
+
+    Returns: True if a path from the starting node to the goal node exists
+    """
+    if graph is None:
+        return goal_node in reachable_nodes(starting_node)
+    seen = bytearray(graph.num_nodes)
+    seen[starting_node] = 1
+    stack = [starting_node]
+    while stack:
+        node = stack.pop()
+        if node == goal_node:
+            return True
+        for connected_node in graph.neighbors(node):
+            if not seen[connected_node]:
+                seen[connected_node] = 1
+                stack.append(connected_node)
+    return False
+
+
+class CSRGraph:
+    """
+    This class describes a directed, weighted graph in compressed sparse row (CSR) form.
+    Nodes are the integer ids 0 .. num_nodes-1, and the edges leaving node u are
+    indices[indptr[u]:indptr[u+1]], with their costs at the same positions of weights.
+    It has the following instance level attributes:
+
+    indptr: int64 array of num_nodes+1 offsets into indices and weights
+    indices: int32 array with the target node id of every edge
+    weights: float64 array with the cost of every edge
+    heuristic: float64 array with the estimated cost from every node to the goal,
+               or None if the graph has no heuristic (only A* needs one)
+
+    Every edge takes 12 bytes and every node 8 (16 with a heuristic), instead of
+    a Python tuple, a float and a list slot per edge for the Node graphs.
+    """
+    def __init__(self, indptr, indices, weights, heuristic=None):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.heuristic = None if heuristic is None else np.asarray(heuristic, dtype=np.float64)
+        # the graph with every edge turned around, built by reverse() when it is first needed
+        self._reverse = None
+
+    def __repr__(self):
+        return 'CSRGraph(nodes={}, edges={})'.format(self.num_nodes, self.num_edges)
+
+    @property
+    def num_nodes(self):
+        return len(self.indptr) - 1
+
+    @property
+    def num_edges(self):
+        return len(self.indices)
+
+    @classmethod
+    def from_edges(cls, num_nodes, sources, targets, weights, heuristic=None):
+        """
+        Builds a graph from parallel lists of edges
+
+        Parameters:
+        - num_nodes: The number of nodes, the ids are 0 .. num_nodes-1
+        - sources, targets, weights: The start id, end id and cost of every edge.
+                                     Edges of the same node keep the order they are given in
+        - heuristic: The estimated cost to the goal of every node, or None
+
+        Returns: A CSRGraph
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        # a stable sort keeps the edges of every node in their original order
+        order = np.argsort(sources, kind='stable')
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=num_nodes), out=indptr[1:])
+        return cls(indptr, np.asarray(targets)[order], np.asarray(weights, dtype=np.float64)[order], heuristic)
+
+    @classmethod
+    def from_nodes(cls, nodes):
+        """
+        Builds a graph from Node objects, as returned by build_graph
+
+        Parameters:
+        - nodes: A Node or a list of Nodes. Every node reachable from them is included,
+                 and their integer IDs become the node ids of the graph
+
+        Returns: A CSRGraph with the same edges, in the same order, and the
+                 heuristic_cost of the nodes if they have one
+        """
+        found = reachable_nodes(nodes)
+        num_nodes = max(found) + 1
+        sources, targets, weights = [], [], []
+        heuristic = None
+        if all(hasattr(node, 'heuristic_cost') for node in found.values()):
+            heuristic = np.zeros(num_nodes)
+        for ID in sorted(found):
+            node = found[ID]
+            if heuristic is not None:
+                heuristic[ID] = node.heuristic_cost
+            for cost, connected_node in node.connected_nodes:
+                sources.append(ID)
+                targets.append(connected_node.ID)
+                weights.append(cost)
+        return cls.from_edges(num_nodes, sources, targets, weights, heuristic)
+
+    def to_nodes(self, node_class):
+        """
+        Builds Node objects with the same edges
+
+        Parameters:
+        - node_class: The Node class to use, it is called as node_class(ID), or as
+                      node_class(ID, heuristic_cost) if the graph has a heuristic
+
+        Returns: A list with the Node of every id
+        """
+        if self.heuristic is None:
+            nodes = [node_class(ID) for ID in range(self.num_nodes)]
+        else:
+            nodes = [node_class(ID, h) for ID, h in enumerate(self.heuristic.tolist())]
+        for ID, node in enumerate(nodes):
+            node.set_connected_nodes([(cost, nodes[target]) for target, cost in self.edges(ID)])
+        return nodes
+
+    def reverse(self):
+        """
+        Returns the graph with every edge turned around, with the same heuristic,
+        for searches that walk back from the goal. It is built once and kept
+        """
+        if self._reverse is None:
+            sources = np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+            self._reverse = CSRGraph.from_edges(self.num_nodes, self.indices, sources, self.weights, self.heuristic)
+            self._reverse._reverse = self
+        return self._reverse
+
+    def neighbors(self, node):
+        """
+        Returns the ids of the nodes the edges of node lead to, as a list
+        """
+        return self.indices[self.indptr[node]:self.indptr[node + 1]].tolist()
+
+    def edges(self, node):
+        """
+        Returns the edges leaving node as a list of (target id, cost) tuples
+        """
+        start, end = self.indptr[node], self.indptr[node + 1]
+        return list(zip(self.indices[start:end].tolist(), self.weights[start:end].tolist()))
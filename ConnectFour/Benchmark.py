@@ -0,0 +1,389 @@
+"""
+Micro-benchmarks for the Connect Four engine
+
+To run the benchmarks, write the following command in terminal after locating to the path of the file:
+
+    python Benchmark.py win_check --positions 2000
+    python Benchmark.py evaluation --positions 2000
+    python Benchmark.py ordering --positions 50 --depth 6
+    python Benchmark.py allocations --positions 20 --depth 4
+    python Benchmark.py solver_table --positions 20
+    python Benchmark.py cutoffs --positions 20 --depth 4
+    python Benchmark.py search --depth 5 --output results.json --compare previous.json
+
+The search benchmark runs get_alpha_beta_move and get_expectimax_move on every
+position of positions.txt, deepening one ply at a time up to --depth, and
+reports nodes searched, nodes per second, time to every depth and the chosen
+move. Its results can be saved and compared against an earlier run.
+"""
+
+# system libs
+import argparse
+import json
+import os
+import random
+import timeit
+import tracemalloc
+
+# 3rd party libs
+import numpy as np
+
+# Local libs
+from Bitboard import Bitboard, bits_from_array, has_won
+from Evaluation import IncrementalEvaluator, window_score, window_scores
+from Instrumentation import InstrumentedSearchEngine
+from Player import AIPlayer
+from Solver import SOLVER_THRESHOLD, Solver
+from TranspositionTable import TranspositionTable
+
+
+def random_positions(count, seed=0):
+    """
+    Returns count random positions reached by playing random legal moves
+    until a player wins or a random number of discs has been dropped
+    """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        position = Bitboard()
+        for _ in range(rng.randint(0, 41)):
+            position.play(rng.choice(position.legal_moves()))
+            if position.last_move_won():
+                break
+        positions.append(position)
+    return positions
+
+
+def string_game_completed(board, player_num):
+    # the string based check that Game.game_completed used before the bitboard one,
+    # kept here as the baseline of the win check benchmark
+    player_win_str = '{0}{0}{0}{0}'.format(player_num)
+    to_str = lambda a: ''.join(a.astype(str))
+
+    for b in [board, board.T]:
+        for row in b:
+            if player_win_str in to_str(row):
+                return True
+    for op_board in [board, np.fliplr(board)]:
+        for offset in range(-(board.shape[0]-4), board.shape[1]-3):
+            if player_win_str in to_str(np.diagonal(op_board, offset=offset).astype(int)):
+                return True
+    return False
+
+
+def benchmark_win_check(count, repeat=5):
+    positions = random_positions(count)
+    boards = [position.to_array() for position in positions]
+    players = [position.last_player for position in positions]
+
+    # every implementation has to agree before we time them
+    for position, board, player in zip(positions, boards, players):
+        expected = string_game_completed(board, player)
+        assert has_won(position.boards[player - 1]) == expected
+        assert has_won(bits_from_array(board, player)) == expected
+        assert position.last_move_won() == expected
+
+    candidates = [
+        ('string search on numpy board', lambda: [string_game_completed(b, p) for b, p in zip(boards, players)]),
+        ('shift-and-mask on numpy board', lambda: [has_won(bits_from_array(b, p)) for b, p in zip(boards, players)]),
+        ('shift-and-mask on bitboard', lambda: [has_won(pos.boards[p - 1]) for pos, p in zip(positions, players)]),
+        ('lines through last move', lambda: [pos.last_move_won() for pos in positions]),
+    ]
+
+    print('Win check over {} positions (best of {})'.format(count, repeat))
+    baseline = None
+    for name, func in candidates:
+        per_check = min(timeit.repeat(func, number=1, repeat=repeat)) / count
+        baseline = baseline or per_check
+        print('{:<32}{:>10.2f} us/check{:>10.1f}x'.format(name, per_check * 1e6, baseline / per_check))
+
+
+def benchmark_evaluation(count, repeat=5):
+    positions = random_positions(count)
+    boards = [position.to_array() for position in positions]
+    stacked = np.stack(boards)
+    legacy = AIPlayer(1, 'legacy')
+    evaluator = IncrementalEvaluator()
+
+    def incremental():
+        # the cost the search pays per leaf: one disc placed, scored and removed again
+        for position in positions:
+            if position.moves:
+                col = position.moves[-1]
+                bit = position.heights[col] - 1
+                evaluator.remove(bit, position.last_player)
+                evaluator.place(bit, position.last_player)
+            evaluator.score(1)
+
+    candidates = [
+        ('legacy string heuristic', lambda: [legacy.evaluation_function(b) for b in boards]),
+        ('vectorized window heuristic', lambda: [window_score(b, 1) for b in boards]),
+        ('batched window heuristic', lambda: window_scores(stacked, 1)),
+        ('incremental window heuristic', incremental),
+    ]
+
+    print('Evaluation over {} positions (best of {})'.format(count, repeat))
+    baseline = None
+    for name, func in candidates:
+        per_eval = min(timeit.repeat(func, number=1, repeat=repeat)) / count
+        baseline = baseline or per_eval
+        print('{:<32}{:>10.2f} us/eval{:>10.1f}x'.format(name, per_eval * 1e6, baseline / per_eval))
+
+
+def benchmark_ordering(count, depth):
+    # only unfinished positions, a position that is already won has nothing to search
+    positions = [position for position in random_positions(4 * count, seed=1)
+                 if not position.last_move_won() and not position.is_full()][:count]
+
+    print('Alpha-beta to depth {} over {} positions'.format(depth, len(positions)))
+    baseline = None
+    for name, move_ordering in [('columns left to right', False), ('ordered moves', True)]:
+        nodes = 0
+        start = timeit.default_timer()
+        for position in positions:
+            ai = AIPlayer(position.to_move, move_ordering=move_ordering, book=None, solver_threshold=None)
+            ai.maxDepth = depth
+            ai.get_alpha_beta_move(position.to_array())
+            nodes += ai.engine.nodes
+        elapsed = timeit.default_timer() - start
+        baseline = baseline or nodes
+        print('{:<32}{:>10} nodes{:>10.1f}x fewer{:>8.2f} s'.format(name, nodes, baseline / nodes, elapsed))
+
+
+def benchmark_cutoffs(count, depth):
+    # only unfinished positions, a position that is already won has nothing to search
+    positions = [position for position in random_positions(4 * count, seed=1)
+                 if not position.last_move_won() and not position.is_full()][:count]
+
+    print('Cutoffs to depth {} over {} positions'.format(depth, len(positions)))
+    cutoffs = {}
+    for algorithm in ['alpha_beta', 'expectimax']:
+        cutoffs[algorithm] = 0
+        nodes = 0
+        for position in positions:
+            engine = InstrumentedSearchEngine(position.to_move)
+            engine.get_move(position.to_array(), algorithm, depth)
+            cutoffs[algorithm] += engine.stats.cutoffs
+            nodes += engine.stats.nodes
+        print('{:<32}{:>10} nodes{:>10} cutoffs'.format(algorithm, nodes, cutoffs[algorithm]))
+    # beta is never finite in expectimax, so every cutoff it counts is a Star1 cutoff of a chance node
+    assert cutoffs['expectimax'] > 0
+
+
+def benchmark_solver_table(count):
+    # endgames the solver takes over, that are not decided by the next disc
+    positions = [position for position in random_positions(20 * count, seed=2)
+                 if position.counter >= 42 - SOLVER_THRESHOLD and not position.last_move_won()
+                 and not position.is_full()][:count]
+
+    print('Solver over {} endgames'.format(len(positions)))
+    results = {}
+    for name, mix_keys in [('exact key masked', False), ('exact key mixed', True)]:
+        solver = Solver()
+        table = solver.transposition_table = TranspositionTable(solver.transposition_table.size, mix_keys)
+        nodes = 0
+        buckets = 0
+        start = timeit.default_timer()
+        for position in positions:
+            table.clear()
+            solver.best_move(position)
+            nodes += solver.nodes
+            buckets += sum(1 for slot in range(0, 2 * table.size, 2)
+                           if table.keys[slot] is not None or table.keys[slot + 1] is not None)
+        elapsed = timeit.default_timer() - start
+        results[name] = nodes, buckets
+        print('{:<32}{:>10} nodes{:>10} buckets used{:>8.2f} s'.format(name, nodes, buckets, elapsed))
+    # the exact keys of Bitboard share their low bits, masked they crowd into a few buckets
+    assert results['exact key mixed'][1] > results['exact key masked'][1]
+    assert results['exact key mixed'][0] <= results['exact key masked'][0]
+
+
+def copying_alpha_beta(ai, board, depth, max_depth, alpha, beta, player_number, stats):
+    # the node expansion AIPlayer used before Search.py: both successor lists are built
+    # (two calls, seven board copies each) before the terminal check, on every node
+    stats['nodes'] += 1
+    potential_successors = ai.successors_helper_function(board, player_number)[0]
+    potential_successors_index = ai.successors_helper_function(board, player_number)[1]
+    stats['boards'] += 2 * len(potential_successors)
+    if depth == max_depth or ai.game_completed_helper_function(board, 3 - player_number):
+        return window_score(board, ai.player_number)
+    maximize = depth%2 == 0
+    v = -np.inf if maximize else np.inf
+    for successor in [potential_successors[i] for i in potential_successors_index]:
+        value = copying_alpha_beta(ai, successor, depth+1, max_depth, alpha, beta, 3 - player_number, stats)
+        if maximize:
+            v = max(v, value)
+            alpha = max(alpha, v)
+        else:
+            v = min(v, value)
+            beta = min(beta, v)
+        if alpha >= beta:
+            break
+    return v
+
+
+def benchmark_allocations(count, depth):
+    positions = [position for position in random_positions(4 * count, seed=2)
+                 if not position.last_move_won() and not position.is_full()][:count]
+    boards = [position.to_array() for position in positions]
+    # built up front, so the preallocated transposition tables don't count towards the peak
+    players = [AIPlayer(position.to_move, move_ordering=False, book=None, solver_threshold=None)
+               for position in positions]
+    for ai in players:
+        ai.maxDepth = depth
+
+    def measure(search):
+        tracemalloc.start()
+        start = timeit.default_timer()
+        nodes, copies = search()
+        elapsed = timeit.default_timer() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return nodes, copies, peak, elapsed
+
+    def copying():
+        stats = {'nodes': 0, 'boards': 0}
+        for ai, board in zip(players, boards):
+            copying_alpha_beta(ai, board, 0, depth, -np.inf, np.inf, ai.player_number, stats)
+        return stats['nodes'], stats['boards']
+
+    def engine():
+        nodes = 0
+        for ai, board in zip(players, boards):
+            ai.get_alpha_beta_move(board)
+            nodes += ai.engine.nodes
+        # the engine makes every move in place on one Bitboard, the only board it
+        # allocates is the one converted from the numpy board at the root
+        return nodes, len(positions)
+
+    print('Alpha-beta to depth {} over {} positions (moves left to right)'.format(depth, len(positions)))
+    for name, search in [('copying successors', copying), ('search engine', engine)]:
+        nodes, copies, peak, elapsed = measure(search)
+        print('{:<24}{:>8} nodes{:>8.2f} boards/node{:>10.1f} KiB peak{:>8.1f} us/node'.format(
+            name, nodes, copies / nodes, peak / 1024, elapsed / nodes * 1e6))
+
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'positions.txt')
+
+
+def load_corpus(path=CORPUS):
+    """
+    Returns [(category, moves, Bitboard)] for every position of the corpus file
+    """
+    corpus = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            category, moves = line.split()
+            position = Bitboard()
+            for col in moves.strip('-'):
+                position.play(int(col))
+            corpus.append((category, moves, position))
+    return corpus
+
+
+def benchmark_search(depth, output=None, compare=None):
+    results = []
+    for category, moves, position in load_corpus():
+        board = position.to_array()
+        for algorithm in ['alpha_beta', 'expectimax']:
+            # one player per position, deepened one ply at a time like the iterative deepening.
+            # The book and the solver would answer some positions without searching at all
+            ai = AIPlayer(position.to_move, book=None, solver_threshold=None)
+            search = ai.get_alpha_beta_move if algorithm == 'alpha_beta' else ai.get_expectimax_move
+            nodes = 0
+            time_to_depth = []
+            start = timeit.default_timer()
+            for d in range(1, depth + 1):
+                ai.maxDepth = d
+                move = int(search(board))
+                nodes += ai.engine.nodes
+                time_to_depth.append(timeit.default_timer() - start)
+            elapsed = time_to_depth[-1]
+            results.append({
+                'category': category,
+                'moves': moves,
+                'algorithm': algorithm,
+                'depth': depth,
+                'nodes': nodes,
+                'seconds': elapsed,
+                'nodes_per_second': nodes / elapsed if elapsed else 0.0,
+                'time_to_depth': time_to_depth,
+                'move': move,
+            })
+
+    print('{:<9}{:<34}{:<12}{:>9}{:>10}{:>12}{:>6}'.format(
+        'category', 'moves', 'algorithm', 'nodes', 'seconds', 'nodes/s', 'move'))
+    for r in results:
+        print('{:<9}{:<34}{:<12}{:>9}{:>10.3f}{:>12.0f}{:>6}'.format(
+            r['category'], r['moves'], r['algorithm'], r['nodes'], r['seconds'], r['nodes_per_second'], r['move']))
+    total_nodes = sum(r['nodes'] for r in results)
+    total_seconds = sum(r['seconds'] for r in results)
+    print('total: {} nodes in {:.2f} s, {:.0f} nodes/s'.format(total_nodes, total_seconds, total_nodes / total_seconds))
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if compare:
+        compare_search_results(compare, results)
+    return results
+
+
+def compare_search_results(path, results):
+    # matches the runs by position and algorithm, and shows what changed
+    with open(path) as f:
+        previous = {(r['moves'], r['algorithm'], r['depth']): r for r in json.load(f)}
+    print('compared with {}:'.format(path))
+    old_nodes = new_nodes = old_seconds = new_seconds = 0
+    for r in results:
+        old = previous.get((r['moves'], r['algorithm'], r['depth']))
+        if old is None:
+            continue
+        old_nodes += old['nodes']
+        new_nodes += r['nodes']
+        old_seconds += old['seconds']
+        new_seconds += r['seconds']
+        if old['move'] != r['move']:
+            print('  move changed on {} {} ({}): {} -> {}'.format(
+                r['category'], r['moves'], r['algorithm'], old['move'], r['move']))
+    if new_nodes and new_seconds:
+        print('  nodes: {} -> {} ({:.2f}x)'.format(old_nodes, new_nodes, old_nodes / new_nodes))
+        print('  time: {:.2f} s -> {:.2f} s ({:.2f}x)'.format(old_seconds, new_seconds, old_seconds / new_seconds))
+
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('benchmark', choices=['win_check', 'evaluation', 'ordering', 'allocations',
+                                              'cutoffs', 'solver_table', 'search'])
+    parser.add_argument('--positions',
+                        type=int,
+                        default=2000,
+                        help='Number of random positions to benchmark on (int)')
+    parser.add_argument('--depth',
+                        type=int,
+                        default=6,
+                        help='Search depth of the search benchmarks (int)')
+    parser.add_argument('--output',
+                        default=None,
+                        help='File to save the search benchmark results to (json)')
+    parser.add_argument('--compare',
+                        default=None,
+                        help='Earlier search benchmark results to compare against (json)')
+    args = parser.parse_args()
+
+    if args.benchmark == 'win_check':
+        benchmark_win_check(args.positions)
+    elif args.benchmark == 'evaluation':
+        benchmark_evaluation(args.positions)
+    elif args.benchmark == 'ordering':
+        benchmark_ordering(args.positions, args.depth)
+    elif args.benchmark == 'allocations':
+        benchmark_allocations(args.positions, args.depth)
+    elif args.benchmark == 'cutoffs':
+        benchmark_cutoffs(args.positions, args.depth)
+    elif args.benchmark == 'solver_table':
+        benchmark_solver_table(args.positions)
+    elif args.benchmark == 'search':
+        benchmark_search(args.depth, args.output, args.compare)
@@ -0,0 +1,309 @@
+"""
+Bitboard representation of a Connect Four position
+
+Layout:
+    Every column uses HEIGHT = ROWS + 1 bits, the extra bit on top of each column
+    is a sentinel that is always empty, so shifting a line of discs never wraps
+    from one column into the next one. Bit 0 is the bottom cell of column 0,
+    bit 6 the sentinel of column 0, bit 7 the bottom cell of column 1, ...
+
+         6 13 20 27 34 41 48   <- sentinel row
+        +---------------------+
+        | 5 12 19 26 33 40 47 |  <- row 0 of the numpy board (top)
+        | 4 11 18 25 32 39 46 |
+        | 3 10 17 24 31 38 45 |
+        | 2  9 16 23 30 37 44 |
+        | 1  8 15 22 29 36 43 |
+        | 0  7 14 21 28 35 42 |  <- row 5 of the numpy board (bottom)
+        +---------------------+
+
+    The position keeps one 64-bit mask per player plus the next free bit of
+    every column, so a move is a couple of integer operations and is undone
+    the same way, without copying anything.
+
+Win detection:
+    has_won checks a whole board with four shift-and-mask steps, one per
+    direction. wins_through_cell and Bitboard.last_move_won only test the
+    (at most 13) precomputed winning lines through a single cell, which is all
+    that can change when one disc is dropped.
+
+Hashing:
+    Every position carries a Zobrist hash, the XOR of one random 64-bit key
+    per (player, cell) that holds a disc. play and undo XOR a single key in
+    or out, so the hash is kept up to date for free and can index the
+    transposition table. mirror_hash is the hash of the mirrored position,
+    kept up to date the same way.
+
+Symmetry:
+    key is an exact, collision free encoding of a position in 49 bits: the
+    discs of the player to move plus one extra bit on top of every column.
+    Every column of the key only depends on that column, so mirroring the key
+    column by column gives the key of the mirrored position, and the smaller
+    of the two (canonical_key) is the same for a position and its mirror image.
+    canonical_hash does the same with the two Zobrist hashes. Caches keyed by
+    either store moves for the canonical side, mirror_move maps them back.
+"""
+
+import random
+
+import numpy as np
+
+ROWS = 6
+COLS = 7
+HEIGHT = ROWS + 1
+
+# bit index of the bottom cell and one past the top playable cell of every column
+BOTTOM_BITS = [col * HEIGHT for col in range(COLS)]
+TOP_BITS = [col * HEIGHT + ROWS for col in range(COLS)]
+BOTTOM_MASK = sum(1 << bit for bit in BOTTOM_BITS)
+# every bit of column 0, sentinel included
+COLUMN_MASK = (1 << HEIGHT) - 1
+
+
+# bit distance between neighbouring cells: vertical, horizontal, and the two diagonals
+DIRECTIONS = [1, HEIGHT, HEIGHT - 1, HEIGHT + 1]
+
+
+def build_winning_lines():
+    """
+    Returns the bitmask of every line of four cells on the board (69 of them)
+    """
+    lines = []
+    for col in range(COLS):
+        for row in range(ROWS):
+            # (column step, row step) of vertical, horizontal and the two diagonal lines
+            for dc, dr in [(0, 1), (1, 0), (1, 1), (1, -1)]:
+                end_col, end_row = col + 3 * dc, row + 3 * dr
+                if 0 <= end_col < COLS and 0 <= end_row < ROWS:
+                    line = 0
+                    for k in range(4):
+                        line |= 1 << ((col + k * dc) * HEIGHT + row + k * dr)
+                    lines.append(line)
+    return lines
+
+
+WINNING_LINES = build_winning_lines()
+# the winning lines that go through every bit, empty for the sentinel bits
+LINES_THROUGH_BIT = [[line for line in WINNING_LINES if line >> bit & 1]
+                     for bit in range(COLS * HEIGHT)]
+
+
+def has_won(bits):
+    """
+    Returns True if the discs in bits contain four in a row in any direction
+    """
+    for shift in DIRECTIONS:
+        pairs = bits & (bits >> shift)
+        if pairs & (pairs >> 2 * shift):
+            return True
+    return False
+
+
+# ZOBRIST[player - 1][bit] is the key of a disc of player on bit, seeded so
+# hashes are the same in every process
+_zobrist_rng = random.Random(0xC4)
+ZOBRIST = [[_zobrist_rng.getrandbits(64) for bit in range(COLS * HEIGHT)] for player in (1, 2)]
+# MIRROR_ZOBRIST[player - 1][bit] is the key of the mirror image of that disc
+MIRROR_ZOBRIST = [[keys[(COLS - 1 - bit // HEIGHT) * HEIGHT + bit % HEIGHT] for bit in range(COLS * HEIGHT)]
+                  for keys in ZOBRIST]
+
+
+def mirror_bits(bits):
+    """
+    Returns bits with the columns in reverse order, column 0 becomes column 6
+    """
+    mirrored = 0
+    for col in range(COLS):
+        mirrored |= (bits >> (col * HEIGHT) & COLUMN_MASK) << ((COLS - 1 - col) * HEIGHT)
+    return mirrored
+
+
+def mirror_move(col, mirrored):
+    # a column of the canonical side back on the side of the position, None stays None
+    if mirrored and col is not None:
+        return COLS - 1 - col
+    return col
+
+
+def cell_to_bit(row, col):
+    # row 0 is the top of the numpy board, but the bottom of a bitboard column
+    return col * HEIGHT + (ROWS - 1 - row)
+
+
+def bit_to_cell(bit):
+    return ROWS - 1 - bit % HEIGHT, bit // HEIGHT
+
+
+def bits_from_array(board, player_num):
+    """
+    Returns the discs of player_num on a numpy board as a bitmask
+    """
+    bits = 0
+    for index in np.flatnonzero(board == player_num):
+        bits |= 1 << cell_to_bit(*divmod(int(index), COLS))
+    return bits
+
+
+def wins_through_cell(bits, row, col):
+    """
+    Returns True if the disc at (row, col) of the numpy board is part of four
+    in a row, only the lines through that cell are inspected
+    """
+    for line in LINES_THROUGH_BIT[cell_to_bit(row, col)]:
+        if bits & line == line:
+            return True
+    return False
+
+
+class Bitboard:
+    """
+    This class describes a Connect Four position as two bitmasks.
+    It has the following instance level attributes:
+
+    boards: [discs of player 1, discs of player 2] as integer bitmasks
+    heights: the next free bit index of every column
+    moves: the stack of columns played since the position was created
+    counter: the number of discs on the board
+    hash: the Zobrist hash of the discs on the board
+    mirror_hash: the Zobrist hash of the discs mirrored left to right
+    """
+    def __init__(self):
+        self.boards = [0, 0]
+        self.heights = list(BOTTOM_BITS)
+        self.moves = []
+        self.counter = 0
+        self.hash = 0
+        self.mirror_hash = 0
+
+    @classmethod
+    def from_array(cls, board):
+        """
+        Builds a position from the numpy board used by Game, where 0 is an
+        empty cell and 1 or 2 is a disc of that player
+        """
+        position = cls()
+        for col in range(COLS):
+            # walk the column from the bottom up until the first empty cell
+            for row in range(ROWS - 1, -1, -1):
+                player = int(board[row, col])
+                if player == 0:
+                    break
+                bit = position.heights[col]
+                position.boards[player - 1] |= 1 << bit
+                position.hash ^= ZOBRIST[player - 1][bit]
+                position.mirror_hash ^= MIRROR_ZOBRIST[player - 1][bit]
+                position.heights[col] = bit + 1
+                position.counter += 1
+        return position
+
+    def to_array(self):
+        """
+        Returns the position as a 6x7 numpy board with the same encoding Game uses
+        """
+        board = np.zeros([ROWS, COLS]).astype(np.uint8)
+        for player in (1, 2):
+            bits = self.boards[player - 1]
+            while bits:
+                low = bits & -bits
+                row, col = bit_to_cell(low.bit_length() - 1)
+                board[row, col] = player
+                bits ^= low
+        return board
+
+    def copy(self):
+        position = Bitboard()
+        position.boards = list(self.boards)
+        position.heights = list(self.heights)
+        position.moves = list(self.moves)
+        position.counter = self.counter
+        position.hash = self.hash
+        position.mirror_hash = self.mirror_hash
+        return position
+
+    @property
+    def mask(self):
+        # every occupied cell
+        return self.boards[0] | self.boards[1]
+
+    @property
+    def to_move(self):
+        # player 1 always makes the first move in Game
+        return 1 + (self.counter & 1)
+
+    @property
+    def last_player(self):
+        return 2 - (self.counter & 1)
+
+    def can_play(self, col):
+        return self.heights[col] < TOP_BITS[col]
+
+    def legal_moves(self):
+        return [col for col in range(COLS) if self.heights[col] < TOP_BITS[col]]
+
+    def is_full(self):
+        return self.counter == ROWS * COLS
+
+    def is_win(self, player):
+        return has_won(self.boards[player - 1])
+
+    def last_move_won(self):
+        """
+        Returns True if the last move made with play completed four in a row
+        """
+        if not self.moves:
+            return False
+        bits = self.boards[(self.counter - 1) & 1]
+        for line in LINES_THROUGH_BIT[self.heights[self.moves[-1]] - 1]:
+            if bits & line == line:
+                return True
+        return False
+
+    def key(self):
+        # the discs of the player to move, plus the first free bit of every column, which
+        # mask + BOTTOM_MASK sets without carrying into the next column
+        return self.boards[self.counter & 1] + self.mask + BOTTOM_MASK
+
+    def canonical_key(self):
+        """
+        Returns (key, mirrored): the smaller of the keys of the position and of its
+        mirror image, and whether that is the mirror image
+        """
+        key = self.key()
+        mirrored = mirror_bits(key)
+        if mirrored < key:
+            return mirrored, True
+        return key, False
+
+    def canonical_hash(self):
+        """
+        Returns (hash, mirrored): the smaller of the Zobrist hashes of the position and
+        of its mirror image, and whether that is the mirror image
+        """
+        if self.mirror_hash < self.hash:
+            return self.mirror_hash, True
+        return self.hash, False
+
+    def play(self, col):
+        """
+        Drops a disc of the player to move into col, the column must not be full
+        """
+        bit = self.heights[col]
+        self.boards[self.counter & 1] |= 1 << bit
+        self.hash ^= ZOBRIST[self.counter & 1][bit]
+        self.mirror_hash ^= MIRROR_ZOBRIST[self.counter & 1][bit]
+        self.heights[col] = bit + 1
+        self.moves.append(col)
+        self.counter += 1
+
+    def undo(self):
+        """
+        Takes back the last move made with play
+        """
+        col = self.moves.pop()
+        self.counter -= 1
+        bit = self.heights[col] - 1
+        self.heights[col] = bit
+        self.boards[self.counter & 1] ^= 1 << bit
+        self.hash ^= ZOBRIST[self.counter & 1][bit]
+        self.mirror_hash ^= MIRROR_ZOBRIST[self.counter & 1][bit]
+        return col
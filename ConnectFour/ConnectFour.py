@@ -1,6 +1,6 @@
 # system libs
 import argparse
-import multiprocessing as mp
+import logging
 import tkinter as tk
 
 # 3rd party libs
@@ -8,10 +8,9 @@ import numpy as np
 
 # Local libs
 from Player import AIPlayer, RandomPlayer, HumanPlayer
-
-#https://stackoverflow.com/a/37737985
-def turn_worker(board, send_end, p_func):
-    send_end.send(p_func(board))
+from Search import EVALUATORS
+from GameState import GameState
+from Worker import AIWorker
 
 
 class Game:
@@ -19,10 +18,17 @@ class Game:
         self.players = [player1, player2]
         self.colors = ['yellow', 'red']
         self.current_turn = 0
-        self.board = np.zeros([6,7]).astype(np.uint8)
+        # the board, its legal moves and the last move, kept up to date together, see GameState.py
+        self.state = GameState()
+        self.board = self.state.board
         self.gui_board = []
         self.game_over = False
         self.ai_turn_limit = time
+        # one long-lived search process per ai player, see Worker.py
+        self.ai_workers = {}
+        for turn, player in enumerate(self.players):
+            if player.type == 'ai':
+                self.ai_workers[turn] = AIWorker(player)
 
         #https://stackoverflow.com/a/38159672
         root = tk.Tk()
@@ -40,7 +46,11 @@ class Game:
 
         tk.Button(root, text='Next Move', command=self.make_move).pack()
 
-        root.mainloop()
+        try:
+            root.mainloop()
+        finally:
+            for worker in self.ai_workers.values():
+                worker.close()
 
     def make_move(self):
         if not self.game_over:
@@ -49,26 +59,25 @@ class Game:
             if current_player.type == 'ai':
                 
                 if self.players[int(not self.current_turn)].type == 'random':
-                    p_func = current_player.get_expectimax_move
+                    algorithm = 'expectimax'
                 else:
-                    p_func = current_player.get_alpha_beta_move
+                    algorithm = 'alpha_beta'
                 
                 try:
-                    recv_end, send_end = mp.Pipe(False)
-                    p = mp.Process(target=turn_worker, args=(self.board, send_end, p_func))
-                    p.start()
-                    if p.join(self.ai_turn_limit) is None and p.is_alive():
-                        p.terminate()
-                        raise Exception('Player Exceeded time limit')
+                    move = self.ai_workers[self.current_turn].get_move(self.board, algorithm, self.ai_turn_limit, self.state)
+                    if move is None:
+                        # the search returns before its deadline, so this only happens on an
+                        # overloaded machine, the player loses the turn's search but not the game
+                        late = 'Player {} exceeded the time limit, playing a random move'
+                        print(late.format(current_player.player_number))
+                        move = RandomPlayer(current_player.player_number).get_move(self.board, self.state)
                 except Exception as e:
                     uh_oh = 'Uh oh.... something is wrong with Player {}'
                     print(uh_oh.format(current_player.player_number))
                     print(e)
                     raise Exception('Game Over')
-
-                move = recv_end.recv()
             else:
-                move = current_player.get_move(self.board)
+                move = current_player.get_move(self.board, self.state)
 
             if move is not None:
                 self.update_board(int(move), current_player.player_number)
@@ -85,71 +94,23 @@ class Game:
     # specific index in the array, you just need to return the column number
     # for the move you want to make
     def update_board(self, move, player_num):
-        # reference link: https://www.w3schools.com/python/numpy/numpy_array_slicing.asp
-        # [:,index_num] means slicing from index_num to form a new numpy array
-        if 0 in self.board[:,move]:
-            update_row = -1
-            for row in range(1, self.board.shape[0]):
-                update_row = -1
-                if self.board[row, move] > 0 and self.board[row-1, move] == 0:
-                    update_row = row-1
-                elif row==self.board.shape[0]-1 and self.board[row, move] == 0:
-                    update_row = row
-
-                if update_row >= 0:
-                    self.board[update_row, move] = player_num
-                    self.c.itemconfig(self.gui_board[move][update_row],
-                                      fill=self.colors[self.current_turn])
-                    break
+        # the state knows the lowest empty row of every column, so nothing is searched
+        if self.state.can_play(move):
+            update_row = self.state.play(move)
+            self.c.itemconfig(self.gui_board[move][update_row],
+                              fill=self.colors[self.current_turn])
         else:
             err = 'Invalid move by player {}. Column {}'.format(player_num, move)
             raise Exception(err)
 
 
     def game_completed(self, player_num):
-        # this creates a string of player_num in a row
-        # so if the player_num is 1 then it will create 1111
-        player_win_str = '{0}{0}{0}{0}'.format(player_num) 
-
-        board = self.board
-        # it joins all the elements of that row and turn it into a string
-        to_str = lambda a: ''.join(a.astype(str)) # lambda function check
-
-        def check_horizontal(b):
-            # iterate through the first axis of your array
-            for row in b:
-                if player_win_str in to_str(row):
-                    return True
-            return False
-
-        def check_verticle(b):
-            # calls check_horizontal in the transpose of b
-            return check_horizontal(b.T)
-
-        def check_diagonal(b):
-            for op in [None, np.fliplr]:
-                op_board = op(b) if op else b
-                
-                root_diag = np.diagonal(op_board, offset=0).astype(np.int)
-                if player_win_str in to_str(root_diag):
-                    return True
-
-                for i in range(1, b.shape[1]-3):
-                    for offset in [i, -i]:
-                        diag = np.diagonal(op_board, offset=offset)
-                        diag = to_str(diag.astype(np.int))
-                        if player_win_str in diag:
-                            return True
+        # only the lines through the disc that was just dropped can have been completed
+        return self.state.last_move_won()
 
-            return False
 
-        return (check_horizontal(board) or
-                check_verticle(board) or
-                check_diagonal(board))
 
-
-
-def main(player1, player2, time):
+def main(player1, player2, time, evaluator='window', workers=1, instrument=False):
     """
     Creates player objects based on the string paramters that are passed
     to it and calls play_game()
@@ -157,10 +118,14 @@ def main(player1, player2, time):
     INPUTS:
     player1 - a string ['ai', 'random', 'human']
     player2 - a string ['ai', 'random', 'human']
+    time - seconds an ai player may think about a move
+    evaluator - the heuristic the ai players use, a string ['window', 'batch', 'legacy']
+    workers - number of processes each ai player searches with
+    instrument - whether the ai players log the stats of every search
     """
     def make_player(name, num):
         if name=='ai':
-            return AIPlayer(num)
+            return AIPlayer(num, evaluator, time_limit=time, workers=workers, instrument=instrument)
         elif name=='random':
             return RandomPlayer(num)
         elif name=='human':
@@ -193,6 +158,19 @@ if __name__=='__main__':
                         type=int,
                         default=60,
                         help='Time to wait for a move in seconds (int)')
+    parser.add_argument('--evaluator',
+                        choices=EVALUATORS,
+                        default='window',
+                        help='Heuristic used by the ai players')
+    parser.add_argument('--workers',
+                        type=int,
+                        default=1,
+                        help='Processes each ai player splits its root moves across (int)')
+    parser.add_argument('--instrument',
+                        action='store_true',
+                        help='Log nodes, cutoffs and timings of every ai search as JSON lines')
     args = parser.parse_args()
 
-    main(args.player1, args.player2, args.time)
+    if args.instrument:
+        logging.basicConfig(level=logging.INFO, format='%(message)s')
+    main(args.player1, args.player2, args.time, args.evaluator, args.workers, args.instrument)
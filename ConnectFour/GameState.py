@@ -0,0 +1,80 @@
+"""
+State of a game in progress, shared by Game and the players
+
+Game used to find the landing row of a move by walking the numpy column, and
+RandomPlayer and HumanPlayer rebuilt the list of legal columns by scanning
+every column of the board on every turn. GameState keeps the numpy board
+together with a Bitboard of the same position and a bitmask of the columns
+that are not full, and updates all three in O(1) when a disc is dropped or
+taken back, so the landing row, the legal moves and the win check are
+read off instead of searched for.
+"""
+
+# 3rd party libs
+import numpy as np
+
+# Local libs
+from Bitboard import COLS, HEIGHT, ROWS, TOP_BITS, Bitboard
+
+# LEGAL_MOVES[legal] lists the columns whose bit is set in legal, the lists are shared and never changed
+LEGAL_MOVES = [[col for col in range(COLS) if legal >> col & 1] for legal in range(1 << COLS)]
+
+
+class GameState:
+    """
+    This class describes the game being played.
+    It has the following instance level attributes:
+
+    board: the 6x7 numpy board the players see, encoded like in Game, changed in place
+    position: the same position as a Bitboard
+    legal: bitmask of the columns that are not full, bit col for column col
+    last_move: (row, col) of the last disc dropped, or None
+    """
+    def __init__(self, board=None):
+        self.board = np.zeros([ROWS, COLS]).astype(np.uint8) if board is None else board
+        self.position = Bitboard.from_array(self.board)
+        self.legal = 0
+        for col in range(COLS):
+            if self.position.can_play(col):
+                self.legal |= 1 << col
+        self.last_move = None
+
+    def can_play(self, col):
+        return 0 <= col < COLS and self.legal >> col & 1 == 1
+
+    def legal_moves(self):
+        return LEGAL_MOVES[self.legal]
+
+    def play(self, col):
+        """
+        Drops a disc of the player to move into col, returns the numpy row it lands on
+        """
+        position = self.position
+        row = ROWS - 1 - (position.heights[col] - col * HEIGHT)
+        position.play(col)
+        self.board[row, col] = position.last_player
+        if position.heights[col] == TOP_BITS[col]:
+            self.legal &= ~(1 << col)
+        self.last_move = (row, col)
+        return row
+
+    def undo(self):
+        """
+        Takes back the last disc, returns its column
+        """
+        col = self.position.undo()
+        row = ROWS - 1 - (self.position.heights[col] - col * HEIGHT)
+        self.board[row, col] = 0
+        self.legal |= 1 << col
+        moves = self.position.moves
+        self.last_move = None
+        if moves:
+            last = moves[-1]
+            self.last_move = (ROWS - (self.position.heights[last] - last * HEIGHT), last)
+        return col
+
+    def last_move_won(self):
+        return self.position.last_move_won()
+
+    def is_full(self):
+        return self.legal == 0
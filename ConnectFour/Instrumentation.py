@@ -0,0 +1,184 @@
+"""
+Optional instrumentation of the AIPlayer search
+
+InstrumentedSearchEngine is a SearchEngine that records, for every search:
+    - nodes per depth (summed over all iterations of the iterative deepening)
+      and the effective branching factor
+    - beta cutoffs
+    - evaluation calls and terminal states (wins, full boards, depth limit)
+    - time spent evaluating, generating and making successors, and checking for wins
+    - the principal variation of the Alpha-beta search
+It overrides the engine's per-node methods instead of adding checks to them,
+so AIPlayer(instrument=False), the default, runs the plain SearchEngine and
+pays nothing for it.
+
+The stats of the last search are kept on the engine as a SearchStats object
+and logged as one JSON line to the 'ConnectFour.search' logger.
+"""
+
+# system libs
+import json
+import logging
+import time
+
+# 3rd party libs
+import numpy as np
+
+# Local libs
+from MoveOrdering import MoveOrderer
+from Search import SearchEngine
+
+logger = logging.getLogger('ConnectFour.search')
+
+
+class SearchStats:
+    """
+    This class collects the counters and timers of one search
+    """
+    def __init__(self, player_number, algorithm):
+        self.player_number = player_number
+        self.algorithm = algorithm
+        self.depth_limit = 0
+        self.nodes_by_depth = []
+        self.cutoffs = 0
+        self.evaluations = 0
+        self.wins = 0
+        self.full_boards = 0
+        self.time_evaluation = 0.0
+        self.time_successors = 0.0
+        self.time_win_check = 0.0
+        self.time_total = 0.0
+        self.transposition_table = {}
+        self.principal_variation = []
+
+    def count_node(self, depth):
+        while len(self.nodes_by_depth) <= depth:
+            self.nodes_by_depth.append(0)
+        self.nodes_by_depth[depth] += 1
+
+    @property
+    def nodes(self):
+        return sum(self.nodes_by_depth)
+
+    @property
+    def effective_branching_factor(self):
+        # b such that a uniform tree as deep as the search would have as many nodes
+        depth = len(self.nodes_by_depth) - 1
+        if depth < 1:
+            return 0.0
+        return self.nodes ** (1 / depth)
+
+    def as_dict(self):
+        return {
+            'player': self.player_number,
+            'algorithm': self.algorithm,
+            'depth_limit': self.depth_limit,
+            'nodes': self.nodes,
+            'nodes_by_depth': self.nodes_by_depth,
+            'effective_branching_factor': self.effective_branching_factor,
+            'cutoffs': self.cutoffs,
+            'evaluations': self.evaluations,
+            'terminal_wins': self.wins,
+            'terminal_full_boards': self.full_boards,
+            'time_evaluation': self.time_evaluation,
+            'time_successors': self.time_successors,
+            'time_win_check': self.time_win_check,
+            'time_total': self.time_total,
+            'nodes_per_second': self.nodes / self.time_total if self.time_total else 0.0,
+            'transposition_table': self.transposition_table,
+            'principal_variation': self.principal_variation,
+        }
+
+
+class CountingMoveOrderer(MoveOrderer):
+    # counts the cutoffs the search reports to the move ordering
+    def __init__(self, engine):
+        super().__init__()
+        self.engine = engine
+
+    def record_cutoff(self, position, col, ply, depth):
+        self.engine.stats.cutoffs += 1
+        super().record_cutoff(position, col, ply, depth)
+
+
+class InstrumentedSearchEngine(SearchEngine):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.move_orderer = CountingMoveOrderer(self)
+        self.stats = SearchStats(self.player_number, None)
+
+    def get_move(self, board, algorithm, max_depth, time_limit=None, position=None):
+        self.stats = SearchStats(self.player_number, algorithm)
+        start = time.perf_counter()
+        move = super().get_move(board, algorithm, max_depth, time_limit, position)
+        self.stats.time_total = time.perf_counter() - start
+        self.stats.depth_limit = self.depth_limit
+        self.stats.transposition_table = self.transposition_table.stats()
+        self.stats.principal_variation = self.principal_variation
+        logger.info(json.dumps(self.stats.as_dict()))
+        return move
+
+    def negamax(self, position, depth, alpha, beta):
+        self.stats.count_node(depth)
+        return super().negamax(position, depth, alpha, beta)
+
+    def value_expectimax(self, position, depth, alpha=-np.inf, beta=np.inf):
+        self.stats.count_node(depth)
+        return super().value_expectimax(position, depth, alpha, beta)
+
+    def last_move_won(self, position):
+        # the win check of SearchEngine.terminal_value, timed
+        stats = self.stats
+        start = time.perf_counter()
+        won = super().last_move_won(position)
+        stats.time_win_check += time.perf_counter() - start
+        if won:
+            stats.wins += 1
+        return won
+
+    def evaluate(self, position):
+        # the evaluation of SearchEngine.terminal_value, timed
+        stats = self.stats
+        if position.is_full():
+            stats.full_boards += 1
+        stats.evaluations += 1
+        start = time.perf_counter()
+        value = super().evaluate(position)
+        stats.time_evaluation += time.perf_counter() - start
+        return value
+
+    def batch_leaf(self, position, depth):
+        # the leaves of the 'batch' evaluator are visited here instead of by negamax or value_expectimax
+        self.stats.count_node(depth)
+        return super().batch_leaf(position, depth)
+
+    def batch_evaluate(self, boards):
+        # every board is scored, also the ones whose game is won, so each one counts as an evaluation
+        stats = self.stats
+        stats.evaluations += len(boards)
+        start = time.perf_counter()
+        scores = super().batch_evaluate(boards)
+        stats.time_evaluation += time.perf_counter() - start
+        return scores
+
+    def ordered_moves(self, position, depth, tt_move):
+        # the moves are generated lazily, so only the time spent producing each one is counted
+        moves = iter(super().ordered_moves(position, depth, tt_move))
+        stats = self.stats
+        while True:
+            start = time.perf_counter()
+            col = next(moves, None)
+            stats.time_successors += time.perf_counter() - start
+            if col is None:
+                return
+            yield col
+
+    def play(self, position, col):
+        start = time.perf_counter()
+        super().play(position, col)
+        self.stats.time_successors += time.perf_counter() - start
+
+    def undo(self, position):
+        start = time.perf_counter()
+        super().undo(position)
+        self.stats.time_successors += time.perf_counter() - start
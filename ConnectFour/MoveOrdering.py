@@ -0,0 +1,76 @@
+"""
+Move ordering for the alpha-beta search
+
+Alpha-beta prunes the most when the best move of a node is searched first.
+The moves of a node are tried in this order:
+    1. the best move the transposition table remembers for the position
+    2. the killer moves of the ply, the last two moves that caused a beta cutoff
+       in a sibling position
+    3. the remaining legal moves by history score, the sum of depth^2 over every
+       cutoff the move caused for the side to move, ties broken center-first
+       since central columns take part in the most lines of four
+
+The moves are generated lazily, so when the first move already cuts off,
+the killers are never checked and the remaining moves are never sorted.
+"""
+
+from Bitboard import COLS
+
+# columns from the center out
+CENTER_ORDER = [3, 2, 4, 1, 5, 0, 6]
+# the deepest ply a search can reach on a 6x7 board, plus the root
+MAX_PLY = 43
+
+
+class MoveOrderer:
+    """
+    This class keeps the killer and history tables of a search.
+    It has the following instance level attributes:
+
+    killers: the two latest cutoff moves of every ply
+    history: history score of every column, for player 1 and player 2 to move
+    """
+    def __init__(self):
+        self.killers = [[None, None] for ply in range(MAX_PLY)]
+        self.history = [[0] * COLS, [0] * COLS]
+
+    def new_search(self):
+        """
+        Called once per move: plies are counted from the root, so the killers
+        of the last search don't apply anymore, and older history is halved so
+        recent cutoffs weigh more
+        """
+        for killers in self.killers:
+            killers[0] = killers[1] = None
+        for history in self.history:
+            for col in range(COLS):
+                history[col] >>= 1
+
+    def moves(self, position, ply, tt_move=None):
+        """
+        Yields the legal moves of position, best candidates first
+        """
+        if tt_move is not None and position.can_play(tt_move):
+            yield tt_move
+        first, second = self.killers[ply]
+        if first is not None and first != tt_move and position.can_play(first):
+            yield first
+        if second is not None and second != tt_move and position.can_play(second):
+            yield second
+        history = self.history[position.counter & 1]
+        rest = [col for col in CENTER_ORDER
+                if position.can_play(col) and col != tt_move and col != first and col != second]
+        # sorted is stable, so columns without history keep the center-first order
+        for col in sorted(rest, key=lambda col: -history[col]):
+            yield col
+
+    def record_cutoff(self, position, col, ply, depth):
+        """
+        Remembers col as a move that caused a beta cutoff at ply with depth plies left,
+        position is the one the move was played from
+        """
+        killers = self.killers[ply]
+        if killers[0] != col:
+            killers[1] = killers[0]
+            killers[0] = col
+        self.history[position.counter & 1][col] += depth * depth
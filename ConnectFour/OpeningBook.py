@@ -0,0 +1,157 @@
+"""
+Opening book for AIPlayer
+
+Every game starts from the same near-empty boards, and searching them again
+on every turn gives the same answers every time. The book stores the best
+move of every position up to a given ply, found once, offline, with a search
+much deeper than the one AIPlayer can afford during a game.
+
+Format:
+    The book is a sorted numpy array of uint64 entries saved as a .npy file,
+    one entry per position: the canonical key of the position (see
+    Bitboard.canonical_key) shifted left by 3 bits, with the best column in the
+    3 low bits. A position and its mirror image share one entry, the move is
+    stored for the canonical side and mirrored back on lookup. The file is
+    memory-mapped, so opening it costs nothing and a lookup is a binary search.
+
+To build the book, write the following command in terminal after locating to the path of the file:
+
+    python OpeningBook.py --ply 4 --depth 10 --processes 4
+
+which searches every position with at most 4 discs to depth 10 and writes
+opening_book.npy next to this file, where AIPlayer picks it up.
+"""
+
+# system libs
+import argparse
+import multiprocessing as mp
+import os
+import time
+
+# 3rd party libs
+import numpy as np
+
+# Local libs
+from Bitboard import COLS, Bitboard
+from Search import SearchEngine
+
+# AIPlayer loads the book from here unless it is given another path
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening_book.npy')
+# the move is kept in the low bits of an entry
+MOVE_BITS = 3
+MOVE_MASK = (1 << MOVE_BITS) - 1
+
+
+class OpeningBook:
+    """
+    This class looks up book moves in a memory-mapped book file.
+    It has the following instance level attributes:
+
+    path: the .npy file of the book
+    entries: the sorted entries of the book, memory-mapped
+    """
+    def __init__(self, path=BOOK_PATH):
+        self.path = path
+        self.entries = np.load(path, mmap_mode='r')
+
+    def __getstate__(self):
+        # the mapping is not sent to another process, the copy maps the file again
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, position):
+        """
+        Returns the book move of a Bitboard position, or None if the position is not in the book
+        """
+        key, mirrored = position.canonical_key()
+        index = int(np.searchsorted(self.entries, np.uint64(key << MOVE_BITS)))
+        if index == len(self.entries):
+            return None
+        entry = int(self.entries[index])
+        if entry >> MOVE_BITS != key:
+            return None
+        move = entry & MOVE_MASK
+        return COLS - 1 - move if mirrored else move
+
+
+def book_positions(max_ply):
+    """
+    Returns the moves leading to every position with at most max_ply discs, one
+    per pair of mirror images, leaving out positions where the game is already over
+    """
+    positions = [()]
+    frontier = [()]
+    for ply in range(max_ply):
+        seen = set()
+        next_frontier = []
+        for moves in frontier:
+            position = Bitboard()
+            for col in moves:
+                position.play(col)
+            for col in position.legal_moves():
+                position.play(col)
+                key = position.canonical_key()[0]
+                if key not in seen and not position.last_move_won():
+                    seen.add(key)
+                    next_frontier.append(moves + (col,))
+                position.undo()
+        positions.extend(next_frontier)
+        frontier = next_frontier
+    return positions
+
+
+# search engine of every pool process, set up once by init_worker
+_engines = None
+
+
+def init_worker():
+    global _engines
+    _engines = {player: SearchEngine(player) for player in (1, 2)}
+
+
+def search_book_position(args):
+    """
+    Runs in a pool process: returns the book entry of the position reached by moves
+    """
+    moves, depth = args
+    position = Bitboard()
+    for col in moves:
+        position.play(col)
+    move = _engines[position.to_move].get_move(position.to_array(), 'alpha_beta', depth)
+    key, mirrored = position.canonical_key()
+    if mirrored:
+        move = COLS - 1 - move
+    return key << MOVE_BITS | move
+
+
+def build_book(max_ply, depth, processes=1):
+    """
+    Searches every position with at most max_ply discs to depth, returns the sorted book entries
+    """
+    tasks = [(moves, depth) for moves in book_positions(max_ply)]
+    if processes > 1:
+        with mp.Pool(processes, initializer=init_worker) as pool:
+            entries = pool.map(search_book_position, tasks)
+    else:
+        init_worker()
+        entries = [search_book_position(task) for task in tasks]
+    return np.array(sorted(entries), dtype=np.uint64)
+
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ply', type=int, default=4, help='Book positions with up to this many discs (int)')
+    parser.add_argument('--depth', type=int, default=10, help='Search depth of every book position (int)')
+    parser.add_argument('--processes', type=int, default=1, help='Positions searched at the same time (int)')
+    parser.add_argument('--output', default=BOOK_PATH, help='File to write the book to (.npy)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    entries = build_book(args.ply, args.depth, args.processes)
+    np.save(args.output, entries)
+    print('{} positions written to {} in {:.1f} s'.format(len(entries), args.output, time.perf_counter() - start))
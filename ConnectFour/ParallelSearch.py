@@ -0,0 +1,218 @@
+"""
+Parallel root-split search for AIPlayer
+
+The (up to 7) root moves are searched by a pool of worker processes that is
+started once and kept alive between turns, so every worker keeps its own
+transposition table warm from one move to the next.
+
+Young Brothers Wait:
+    In every iteration of the iterative deepening, the eldest brother (the
+    best root move of the previous iteration, or the center column) is searched
+    first, on its own. Its value becomes the shared alpha, and only then are
+    the younger brothers handed out to the pool. Every worker reads the shared
+    alpha when it starts a move and raises it when it finds a better one, so
+    moves that start later are searched with a narrower window. A younger
+    brother that fails low only returns an upper bound, which is fine since it
+    cannot be the best move anyway.
+
+Expectimax shares alpha the same way: a chance node whose average cannot
+reach alpha anymore is cut off (see SearchEngine.exp_value).
+
+Every search gets a new generation number, shared with the pool next to
+alpha. A root move that was still queued or running when its search timed
+out belongs to an older generation, so it returns as soon as it starts and
+never writes to the alpha of a later search. Tasks carry the absolute
+time.time() deadline of their search, so time spent waiting in the queue
+counts against it and no task runs past the search it belongs to. A search
+that times out or is cancelled moves on to a new generation at once, which
+also stops the root moves that are still running.
+"""
+
+# system libs
+import multiprocessing as mp
+import time
+
+# Local libs
+from Bitboard import COLS, ROWS, Bitboard
+from MoveOrdering import CENTER_ORDER
+from Search import TIME_BUDGET, WIN_BOUND, SearchEngine
+
+# seconds between two looks at the cancel flag while waiting for the pool
+CANCEL_POLL = 0.01
+
+# state of every pool worker, set up once by init_worker
+_engine = None
+_alpha = None
+_generation = None
+# generation of the last search this worker searched a root move of
+_searched_generation = None
+
+
+def init_worker(player_number, evaluator, evaluation_function, table_size, alpha, generation):
+    global _engine, _alpha, _generation
+    _engine = SearchEngine(player_number, evaluator, evaluation_function, table_size)
+    _alpha = alpha
+    _generation = generation
+
+
+class StaleGeneration:
+    # set once the search of generation is over, it cancels the root move of a pool worker
+    def __init__(self, generation):
+        self.generation = generation
+
+    def is_set(self):
+        return _generation.value != self.generation
+
+
+def search_root_move(board, position, col, algorithm, depth_limit, generation, deadline):
+    """
+    Runs in a pool worker, returns (value of playing col on board, nodes visited).
+    The value is None if the time.time() deadline passed first, or if the search
+    of that generation is already over
+    """
+    global _searched_generation
+    # _generation is only changed under the lock of _alpha
+    with _alpha.get_lock():
+        if _generation.value != generation:
+            return None, 0
+        alpha = _alpha.value
+    time_left = None if deadline is None else deadline - time.time()
+    if time_left is not None and time_left <= 0:
+        return None, 0
+    # the move ordering tables of the worker are aged by its first root move of a search only
+    new_search = generation != _searched_generation
+    _searched_generation = generation
+    _engine.cancel = StaleGeneration(generation)
+    value = _engine.search_root_move(board, col, algorithm, depth_limit, alpha, time_left, new_search, position)
+    if value is not None:
+        with _alpha.get_lock():
+            if _generation.value == generation and value > _alpha.value:
+                _alpha.value = value
+    return value, _engine.nodes
+
+
+class ParallelSearch:
+    """
+    This class splits the root moves of a search across a process pool.
+    It has the following instance level attributes:
+
+    workers: number of pool processes
+    pool: the process pool, started on the first search and kept until close()
+    alpha: the best root value found so far in the running iteration, shared with the pool
+    generation: number of the running search, shared with the pool under the lock of alpha
+    cancel: an object whose is_set() turns True when the search has to stop early, or None
+    nodes: number of nodes all workers visited in the last search
+    """
+    def __init__(self, player_number, workers, evaluator='window', evaluation_function=None,
+                 table_size=1 << 16):
+        self.player_number = player_number
+        self.workers = workers
+        self.evaluator = evaluator
+        self.evaluation_function = evaluation_function
+        self.table_size = table_size
+        self.pool = None
+        self.alpha = None
+        self.generation = None
+        self.cancel = None
+        self.nodes = 0
+
+    def __getstate__(self):
+        # a pool cannot be sent to another process, the copy starts its own when it needs one
+        state = self.__dict__.copy()
+        state['pool'] = None
+        state['alpha'] = None
+        state['generation'] = None
+        return state
+
+    def start(self):
+        if self.pool is None:
+            self.alpha = mp.Value('d', float('-inf'))
+            self.generation = mp.Value('l', 0, lock=False)
+            self.pool = mp.Pool(self.workers, initializer=init_worker,
+                                initargs=(self.player_number, self.evaluator, self.evaluation_function,
+                                          self.table_size, self.alpha, self.generation))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+    def get_move(self, board, algorithm, max_depth, time_limit=None, position=None):
+        """
+        Same contract as SearchEngine.get_move, with the root moves searched in parallel.
+        The Bitboard position is sent along with the board, so the pool does not rebuild it
+        """
+        self.start()
+        self.nodes = 0
+        # tasks of earlier searches that are still queued or running become stale
+        with self.alpha.get_lock():
+            self.generation.value += 1
+        if position is None:
+            position = Bitboard.from_array(board)
+        order = [col for col in CENTER_ORDER if position.can_play(col)]
+        if time_limit is None:
+            result = self.root_split(board, position, algorithm, order, max_depth, None)
+            # None only when the search was cancelled
+            return order[0] if result is None else result[1]
+
+        # wall-clock time, so the pool processes can compare it with their own clock
+        deadline = time.time() + time_limit * TIME_BUDGET
+        best_move = order[0]
+        for depth_limit in range(1, ROWS*COLS - position.counter + 1):
+            result = self.root_split(board, position, algorithm, order, depth_limit, deadline)
+            if result is None:
+                break
+            values, best_move = result
+            if abs(values[best_move]) >= WIN_BOUND:
+                break
+            # the next iteration starts with the best moves of this one, eldest brother first
+            order.sort(key=lambda col: -values[col])
+        return best_move
+
+    def root_split(self, board, position, algorithm, order, depth_limit, deadline):
+        """
+        Searches every move in order to depth_limit, returns ({move: value}, best move),
+        or None if the time.time() deadline passed, or the search was cancelled, before
+        all of them were searched
+        """
+        def time_left():
+            return None if deadline is None else max(deadline - time.time(), 0)
+
+        def wait(result):
+            # waits in short slices, so a cancelled search stops waiting right away
+            while not result.ready():
+                left = time_left()
+                if left == 0 or (self.cancel is not None and self.cancel.is_set()):
+                    raise mp.TimeoutError()
+                result.wait(CANCEL_POLL if left is None else min(left, CANCEL_POLL))
+            return result.get()
+
+        generation = self.generation.value
+        with self.alpha.get_lock():
+            self.alpha.value = float('-inf')
+        # the eldest brother is searched alone, so the others start with its value as alpha
+        results = {order[0]: self.pool.apply_async(search_root_move,
+                                                   (board, position, order[0], algorithm, depth_limit,
+                                                    generation, deadline))}
+        try:
+            eldest = wait(results[order[0]])
+            for col in order[1:]:
+                results[col] = self.pool.apply_async(search_root_move,
+                                                     (board, position, col, algorithm, depth_limit,
+                                                      generation, deadline))
+            values = {order[0]: eldest}
+            for col in order[1:]:
+                values[col] = wait(results[col])
+        except mp.TimeoutError:
+            # the root moves still queued or running stop as soon as they notice
+            with self.alpha.get_lock():
+                self.generation.value += 1
+            return None
+
+        if any(value is None for value, nodes in values.values()):
+            return None
+        self.nodes += sum(nodes for value, nodes in values.values())
+        values = {col: value for col, (value, nodes) in values.items()}
+        # ties go to the earlier move in order, like the sequential search
+        best_move = max(order, key=lambda col: (values[col], -order.index(col)))
+        return values, best_move
@@ -45,54 +45,101 @@ Helper functions for Alpha-beta and Expectimax:
 References: Infinity values: https://www.geeksforgeeks.org/python-infinity/ 
 """
 
+import os
+import time
+
 import numpy as np
 
+from Bitboard import COLS, ROWS, Bitboard, bits_from_array, has_won
+from Evaluation import window_score
+from Instrumentation import InstrumentedSearchEngine
+from OpeningBook import BOOK_PATH, OpeningBook
+from ParallelSearch import ParallelSearch
+from Search import TIME_BUDGET, SearchEngine
+from Solver import SOLVER_THRESHOLD, Solver, outcome
+
 class AIPlayer:
-    def __init__(self, player_number):
+    def __init__(self, player_number, evaluator='window', table_size=1 << 16, time_limit=None,
+                 move_ordering=True, workers=1, instrument=False, book=BOOK_PATH,
+                 solver_threshold=SOLVER_THRESHOLD):
         self.player_number = player_number
         self.type = 'ai'
         self.player_string = 'Player {}:ai'.format(player_number)
         self.maxDepth = 3 # this is the maximum depth
+        # with a time limit (in seconds) the search deepens past maxDepth until it runs out of time
+        self.time_limit = time_limit
+        # switch between the heuristics so they can be compared against each other
+        self.evaluator = evaluator
+        # the search itself, with the transposition table and move ordering tables it keeps
+        # between moves, see Search.py. The instrumented one also collects SearchStats
+        engine_class = InstrumentedSearchEngine if instrument else SearchEngine
+        self.engine = engine_class(player_number, evaluator, self.evaluation_function,
+                                   table_size, move_ordering)
+        # with more than one worker the root moves are searched by a process pool, see ParallelSearch.py
+        self.workers = workers
+        self.parallel_search = None
+        if workers > 1:
+            self.parallel_search = ParallelSearch(player_number, workers, evaluator,
+                                                  self.evaluation_function, table_size)
+        # opening moves are looked up in the book before searching, see OpeningBook.py.
+        # Without a book file (or with book=None) every move is searched
+        self.book = None
+        if book is not None and os.path.exists(book):
+            self.book = OpeningBook(book)
+        # once solver_threshold or fewer cells are empty, the game is solved to the end instead
+        # of searched to maxDepth, see Solver.py. None switches the solver off
+        self.solver_threshold = solver_threshold
+        self.solver = None if solver_threshold is None else Solver()
+        # ('win' / 'loss' / 'draw', plies to the end) proven for the last move, None if it was searched
+        self.last_solution = None
+
+    def last_search_stats(self):
+        # SearchStats of the last move when the player was created with instrument=True, else None
+        return getattr(self.engine, 'stats', None)
+
+    def set_cancel(self, cancel):
+        # cancel.is_set() stops the search of the move being computed early, see Worker.py
+        self.engine.cancel = cancel
+        if self.solver is not None:
+            self.solver.cancel = cancel
+        if self.parallel_search is not None:
+            self.parallel_search.cancel = cancel
+
+    def close(self):
+        # stops the process pool of the parallel search, if there is one
+        if self.parallel_search is not None:
+            self.parallel_search.close()
+
+    def solve_endgame(self, position, wins_only=False):
+        """
+        Returns the solver's move for a Bitboard position near the end of the game, or None
+        if the position has too many empty cells, the solver ran out of its share of the
+        time, or (with wins_only) it could not prove a win
+        """
+        self.last_solution = None
+        if self.solver is None or ROWS * COLS - position.counter > self.solver_threshold:
+            return None
+        # the solver may use half of the turn, the search still gets the rest if it gives up
+        time_limit = None if self.time_limit is None else self.time_limit * TIME_BUDGET / 2
+        result = self.solver.best_move(position, time_limit)
+        if result is None:
+            return None
+        move, score = result
+        if wins_only and score <= 0:
+            return None
+        self.last_solution = outcome(score, position.counter)
+        return move
 
-    def game_completed_helper_function(self, board, player_num):
-        # this creates a string of player_num in a row
-        # so if the player_num is 1 then it will create 1111
-        player_win_str = '{0}{0}{0}{0}'.format(player_num) 
-
-        # it joins all the elements of that row and turn it into a string
-        to_str = lambda a: ''.join(a.astype(str)) # lambda function check
-
-        def check_horizontal(b):
-            # iterate through the first axis of your array
-            for row in b:
-                if player_win_str in to_str(row):
-                    return True
-            return False
-
-        def check_verticle(b):
-            # calls check_horizontal in the transpose of b
-            return check_horizontal(b.T)
-
-        def check_diagonal(b):
-            for op in [None, np.fliplr]:
-                op_board = op(b) if op else b
-                
-                root_diag = np.diagonal(op_board, offset=0).astype(np.int)
-                if player_win_str in to_str(root_diag):
-                    return True
-
-                for i in range(1, b.shape[1]-3):
-                    for offset in [i, -i]:
-                        diag = np.diagonal(op_board, offset=offset)
-                        diag = to_str(diag.astype(np.int))
-                        if player_win_str in diag:
-                            return True
-
-            return False
+    def search_time_limit(self, start):
+        # the time limit of the search, less the time the solver already took
+        if self.time_limit is None:
+            return None
+        return self.time_limit - (time.perf_counter() - start)
 
-        return (check_horizontal(board) or
-                check_verticle(board) or
-                check_diagonal(board))
+    def game_completed_helper_function(self, board, player_num):
+        # turn the discs of player_num into a bitmask and look for four in a row
+        # with shift-and-mask, instead of searching strings of every line
+        return has_won(bits_from_array(board, player_num))
 
     # check this afterwards
     def successors_helper_function(self, board, player_number):
@@ -142,14 +189,14 @@ class AIPlayer:
             count = 0
             for op in [None, np.fliplr]:
                 op_board = op(b) if op else b
-                root_diag = np.diagonal(op_board, offset=0).astype(np.int)
+                root_diag = np.diagonal(op_board, offset=0).astype(int)
                 if potential_player_win_str in to_str(root_diag):
                     count = count + to_str(root_diag).count(potential_player_win_str)
 
                 for i in range(1, b.shape[1]-3):
                     for offset in [i, -i]:
                         diag = np.diagonal(op_board, offset=offset)
-                        diag = to_str(diag.astype(np.int))
+                        diag = to_str(diag.astype(int))
                         if potential_player_win_str in diag:
                             count = count + diag.count(potential_player_win_str)
             return count
@@ -159,7 +206,7 @@ class AIPlayer:
         utility_list.append(check_diagonal(board))
         return sum(utility_list)
     
-    def get_alpha_beta_move(self, board):
+    def get_alpha_beta_move(self, board, state=None):
         
         """
         Given the current state of the board, return the next move based on
@@ -176,81 +223,27 @@ class AIPlayer:
                 - spaces that are unoccupied are marked as 0
                 - spaces that are occupied by player 1 have a 1 in them
                 - spaces that are occupied by player 2 have a 2 in them
+        state - the GameState of the game, if there is one, whose Bitboard is
+                searched so the position doesn't have to be rebuilt from the board
 
         RETURNS:
         The 0 based index of the column that represents the next move
         """
-        # dispatcher
-        def value_alpha_beta(self, board, depth, alpha, beta, player_number):
-            # flag counter for the MAX according to level
-            if depth%2 == 0: MAX = True
-            else: MAX = False
-            # if the state is a terminal state (when the value reached the maximum depth or winning states met)
-            # return the state's utiltiy
-            if depth == self.maxDepth or self.game_completed_helper_function(board, player_number):
-                return self.evaluation_function(board), None
-            # if the next agent is MAX: return max_value(state)
-            if MAX:
-                # same thing in here for returning 
-                max_value_f = max_value(self, board, depth, alpha, beta, player_number)
-                # print(max_value_f)
-                return max_value_f[0], max_value_f[1]
-            # if the next agent is MIN: return min_value(state)
-            else:
-                min_value_f = min_value(self, board, depth, alpha, beta, player_number)
-                return min_value_f[0], min_value_f[1]
-            
-        def max_value(self, board, depth, alpha, beta, player_number):
-            # initialize v to -inf
-            v = -np.inf
-            move = 0
-            # potential successor states
-            potential_successors = self.successors_helper_function(board, player_number)[0]
-            potential_successors_index = self.successors_helper_function(board, player_number)[1]
-            # if the state is a terminal state (when the value reached the maximum depth or winning states met)
-            # return the state's utiltiy
-            if depth == self.maxDepth or self.game_completed_helper_function(board, player_number):
-                return self.evaluation_function(board), None
-            # for each successor of state:
-            for i, successor in enumerate(potential_successors):
-                ov = v
-                v = max(v, value_alpha_beta(self, successor, depth+1, alpha, beta, player_number)[0])
-                if ov != v and (i < len(potential_successors_index)):
-                    move = potential_successors_index[i] 
-                if v >= beta: return v, None
-                alpha = max(alpha, v)
-            return v, move
-        
-        def min_value(self, board, depth, alpha, beta, player_number):
-            # initialize v to +inf
-            v = np.inf
-            move = 0
-            # potential successor states
-            potential_successors = self.successors_helper_function(board, player_number)[0]
-            potential_successors_index = self.successors_helper_function(board, player_number)[1]
-            # if the state is a terminal state (when the value reached the maximum depth or winning states met)
-            # return the state's utiltiy
-            if depth == self.maxDepth or self.game_completed_helper_function(board, player_number):
-                return self.evaluation_function(board), None
-            # for each successor state:
-            for i, successor in enumerate(potential_successors):
-                ov = v
-                v = min(v, value_alpha_beta(self, successor, depth+1, alpha, beta, player_number)[0])
-                # update move
-                if ov != v and (i < len(potential_successors_index)):
-                    move = potential_successors_index[i]
-                if v <= alpha: return v, None
-                beta = min(beta, v)
-            return v, move
-        
-        # initializing the environment for alpha-beta 
-        depth = 0
-        alpha = -np.inf
-        beta = np.inf
-        return value_alpha_beta(self, board, depth, alpha, beta, self.player_number)[1]
-        raise NotImplementedError('Whoops I don\'t know what to do')
-
-    def get_expectimax_move(self, board):
+        start = time.perf_counter()
+        position = Bitboard.from_array(board) if state is None else state.position
+        if self.book is not None:
+            move = self.book.lookup(position)
+            if move is not None:
+                return move
+        move = self.solve_endgame(position)
+        if move is not None:
+            return move
+        time_limit = self.search_time_limit(start)
+        if self.parallel_search is not None:
+            return self.parallel_search.get_move(board, 'alpha_beta', self.maxDepth, time_limit, position)
+        return self.engine.get_move(board, 'alpha_beta', self.maxDepth, time_limit, position)
+
+    def get_expectimax_move(self, board, state=None):
         """
         Given the current state of the board, return the next move based on
         the expectimax algorithm.
@@ -267,74 +260,22 @@ class AIPlayer:
                 - spaces that are unoccupied are marked as 0
                 - spaces that are occupied by player 1 have a 1 in them
                 - spaces that are occupied by player 2 have a 2 in them
+        state - the GameState of the game, if there is one, whose Bitboard is
+                searched so the position doesn't have to be rebuilt from the board
 
         RETURNS:
         The 0 based index of the column that represents the next move
         """
-        # dispatcher
-        # MAX as a boolean value, so True or False statements when calling
-        def value_expectimax(self, board, depth, player_number):
-            # flag counter for the MAX according to level
-            if depth%2 == 0: MAX = True
-            else: MAX = False
-            # if the state is a terminal state (when the value reached the maximum depth or winning states met)
-            # return the state's utiltiy
-            if depth == self.maxDepth or self.game_completed_helper_function(board, player_number):
-                return self.evaluation_function(board), None
-            # if the next agent is MAX: return max_value(state)
-            if MAX:
-                max_value_f_1 = max_value(self, board, depth, player_number)
-                return max_value_f_1[0], max_value_f_1[1]
-            # if the next agent is EXP: return exp_value(state)
-            else:
-                exp_value_f = exp_value(self, board, depth, player_number)
-                return exp_value_f[0], exp_value_f[1]
-        
-        def max_value(self, board, depth, player_number):
-            # initialize v to -inf
-            v = -np.inf
-            move = 0
-            # potential successor states
-            potential_successors = self.successors_helper_function(board, player_number)[0]
-            potential_successors_index = self.successors_helper_function(board, player_number)[1]
-            # if the state is a terminal state (when the value reached the maximum depth or winning states met)
-            # return the state's utiltiy
-            if depth == self.maxDepth or self.game_completed_helper_function(board, player_number):
-                return self.evaluation_function(board), None
-            # for each successor of state:
-            for i, successor in enumerate(potential_successors):
-                ov = v
-                v = max(v, value_expectimax(self, successor, depth+1, player_number)[0])
-                # update move
-                if ov != v and (i < len(potential_successors_index)):
-                    # print(i) # 6
-                    # print(len(potential_successors_index))
-                    move = potential_successors_index[i] # 6
-            return v, move
-        
-        def exp_value(self, board, depth, player_number):
-            # initialize v to 0
-            v = 0
-            move = 0
-            # potential successor states
-            potential_successors = self.successors_helper_function(board, player_number)[0]
-            potential_successors_index = self.successors_helper_function(board, player_number)[1] 
-            # check if it's the terminal states
-            if depth == self.maxDepth or self.game_completed_helper_function(board, player_number):
-                return self.evaluation_function(board), None
-            # for each successor state:
-            for i, successor in enumerate(potential_successors):
-                ov = v
-                p = int(1/len(potential_successors))
-                v += p * value_expectimax(self, successor, depth+1, player_number)[0]
-                # update move
-                if ov != v and (i < len(potential_successors_index)): 
-                    move = potential_successors_index[i]
-            return v, move
-
-        depth = 0
-        return value_expectimax(self, board, depth, self.player_number)[1]
-        raise NotImplementedError('Whoops I don\'t know what to do')
+        # against a random player only a proven win beats the expected value
+        start = time.perf_counter()
+        position = Bitboard.from_array(board) if state is None else state.position
+        move = self.solve_endgame(position, wins_only=True)
+        if move is not None:
+            return move
+        time_limit = self.search_time_limit(start)
+        if self.parallel_search is not None:
+            return self.parallel_search.get_move(board, 'expectimax', self.maxDepth, time_limit, position)
+        return self.engine.get_move(board, 'expectimax', self.maxDepth, time_limit, position)
 
 
     # for averaging the utilities for states
@@ -355,6 +296,9 @@ class AIPlayer:
         The utility value for the current board
         """
         player_number = self.player_number
+        if self.evaluator != 'legacy':
+            return window_score(board, player_number)
+
         utility = 0
         if player_number == 1:
             opponent = 2
@@ -375,7 +319,7 @@ class RandomPlayer:
         self.type = 'random'
         self.player_string = 'Player {}:random'.format(player_number)
 
-    def get_move(self, board):
+    def get_move(self, board, state=None):
         """
         Given the current board state select a random column from the available
         valid moves.
@@ -389,10 +333,14 @@ class RandomPlayer:
                 - spaces that are unoccupied are marked as 0
                 - spaces that are occupied by player 1 have a 1 in them
                 - spaces that are occupied by player 2 have a 2 in them
+        state - the GameState of the game, if there is one, whose legal moves
+                are kept up to date so the board doesn't have to be scanned
 
         RETURNS:
         The 0 based index of the column that represents the next move
         """
+        if state is not None:
+            return np.random.choice(state.legal_moves())
         valid_cols = []
         # shape is a property of NumPy array, which reflects the dimensions
         # --> returns a list of dimension's length on it 
@@ -414,7 +362,7 @@ class HumanPlayer:
         self.type = 'human'
         self.player_string = 'Player {}:human'.format(player_number)
 
-    def get_move(self, board):
+    def get_move(self, board, state=None):
         """
         Given the current board state returns the human input for next move
 
@@ -427,15 +375,19 @@ class HumanPlayer:
                 - spaces that are unoccupied are marked as 0
                 - spaces that are occupied by player 1 have a 1 in them
                 - spaces that are occupied by player 2 have a 2 in them
+        state - the GameState of the game, if there is one, see RandomPlayer.get_move
 
         RETURNS:
         The 0 based index of the column that represents the next move
         """
 
-        valid_cols = []
-        for i, col in enumerate(board.T):
-            if 0 in col:
-                valid_cols.append(i)
+        if state is not None:
+            valid_cols = state.legal_moves()
+        else:
+            valid_cols = []
+            for i, col in enumerate(board.T):
+                if 0 in col:
+                    valid_cols.append(i)
 
         move = int(input('Enter your move: '))
 
@@ -0,0 +1,507 @@
+"""
+Search engine behind AIPlayer
+
+SearchEngine holds everything a search needs between nodes and between moves:
+the incremental evaluator, the transposition table, the move ordering tables,
+the node counter and the deadline. The Alpha-beta and Expectimax recursions are
+methods of the engine, so nothing is redefined on every move, and every node:
+    1. counts itself and checks the deadline
+    2. returns right away if it is terminal (a win, a full board or the depth limit)
+    3. returns right away if the transposition table can answer it
+    4. only then walks its successors, once, making each move in place on the
+       position and taking it back after it has been valued
+The search never copies a board: the Bitboard, the incremental evaluator and,
+for the evaluators that need one, the engine's numpy board are all changed in
+place by play and taken back by undo, so a search to depth d holds O(d) state
+(the move stack) however many nodes it visits.
+
+A position and its mirror image have the same value, so the transposition table
+and the evaluation cache are keyed by the canonical hash (Bitboard.canonical_hash),
+and the best move is stored for the canonical side and mirrored back on lookup.
+"""
+
+import time
+
+import numpy as np
+
+from Bitboard import COLS, HEIGHT, ROWS, Bitboard, mirror_move
+from Evaluation import IncrementalEvaluator, window_scores
+from MoveOrdering import MAX_PLY, MoveOrderer
+from TranspositionTable import EXACT, LOWER, UPPER, TranspositionTable
+
+# utility of a won game, larger than any value of the evaluation function
+WIN_SCORE = 1000000
+# win and loss values are at least this far from 0, whatever ply they happen on
+WIN_BOUND = WIN_SCORE - 42
+# 'window' is the heuristic of Evaluation.py kept up to date move by move, 'batch' the same
+# heuristic scoring all children of a node next to the depth limit in one numpy call, and
+# 'legacy' the string based one of AIPlayer
+EVALUATORS = ['window', 'batch', 'legacy']
+# half width of the first window the Alpha-beta root searches around the value of an earlier iteration
+ASPIRATION_WINDOW = 200
+# every value the search returns lies within these, they bound the successors of an
+# Expectimax chance node that have not been searched yet
+MIN_VALUE = -WIN_SCORE
+MAX_VALUE = WIN_SCORE
+# mixed into the hash of expectimax entries so they never answer an alpha-beta lookup
+EXPECTIMAX_KEY = 0x9E3779B97F4A7C15
+# share of the time limit the iterative deepening search may use, the rest covers
+# starting the worker process and sending the move back to Game
+TIME_BUDGET = 0.8
+# the evaluation cache is emptied when it holds this many boards
+EVALUATION_CACHE_SIZE = 1 << 16
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside the search when the deadline has passed, the iteration
+    that was running is thrown away
+    """
+    pass
+
+
+class SearchEngine:
+    """
+    This class searches Connect Four positions for one player.
+    It has the following instance level attributes:
+
+    player_number: the player the values are computed for
+    evaluator: the heuristic used at the depth limit, one of EVALUATORS
+    evaluation_function: scores a numpy board, used by the 'legacy' evaluator
+    transposition_table: kept between moves, so positions searched on the last
+                         turn are not searched again
+    evaluation_cache: values of the evaluation_function by canonical hash, also kept between moves
+    board: numpy copy of the position being searched, kept in step by play and undo
+           for the evaluators that read a numpy board
+    leaf_boards: preallocated stack the 'batch' evaluator fills with the children of a node
+    move_ordering: whether moves are ordered by MoveOrderer or tried left to right
+    pv_table: pv_table[ply] is the principal variation found from that ply on
+    principal_variation: the principal variation of the last search, starting with its move
+    depth_limit: depth of the iteration that is running
+    deadline: time.perf_counter() value the iteration has to stop at, or None
+    cancel: an object whose is_set() turns True when the search has to stop before
+            its deadline, like a multiprocessing Event, or None
+    nodes: number of nodes visited by the last search
+    """
+    def __init__(self, player_number, evaluator='window', evaluation_function=None,
+                 table_size=1 << 16, move_ordering=True):
+        self.player_number = player_number
+        self.evaluator = evaluator
+        self.evaluation_function = evaluation_function
+        self.incremental_evaluator = IncrementalEvaluator()
+        self.transposition_table = TranspositionTable(table_size)
+        self.evaluation_cache = {}
+        self.board = None
+        self.leaf_boards = np.zeros([COLS, ROWS, COLS]).astype(np.uint8)
+        self.move_ordering = move_ordering
+        self.move_orderer = MoveOrderer()
+        self.pv_table = [[] for ply in range(MAX_PLY + 1)]
+        self.principal_variation = []
+        self.depth_limit = 0
+        self.deadline = None
+        self.cancel = None
+        self.nodes = 0
+
+    def get_move(self, board, algorithm, max_depth, time_limit=None, position=None):
+        """
+        Returns the move for the numpy board found by algorithm ('alpha_beta'
+        or 'expectimax'), searched to max_depth or, with a time limit in
+        seconds, as deep as the time allows. position is the Bitboard of the
+        board if the caller keeps one (see GameState), it is copied, not changed
+        """
+        return self.search(board, algorithm, max_depth, time_limit, position)[0]
+
+    def search(self, board, algorithm, max_depth, time_limit=None, position=None):
+        """
+        Same as get_move, but returns (move, principal variation): the moves both
+        players are expected to play from the board on, starting with the move
+        """
+        # a copy keeps the hashes and heights of the caller's position without scanning the board
+        position = Bitboard.from_array(board) if position is None else position.copy()
+        self.reset(position, board)
+        if algorithm == 'alpha_beta':
+            search = lambda previous: self.aspiration_search(position, previous)
+        else:
+            search = lambda previous: self.value_expectimax(position, 0)
+        move, self.principal_variation = self.iterative_deepening(search, position, max_depth, time_limit)
+        return move, self.principal_variation
+
+    def search_root_move(self, board, col, algorithm, depth_limit, alpha=None, time_left=None,
+                         new_search=True, position=None):
+        """
+        Returns the value of playing col on the numpy board, searched to depth_limit
+        with alpha as the lower bound of the search, or None if time_left
+        seconds ran out first. This is one root move of ParallelSearch, which passes
+        new_search=False for every root move after the first of the same search.
+        position is the Bitboard of the board, as in get_move
+        """
+        position = Bitboard.from_array(board) if position is None else position.copy()
+        self.reset(position, board, new_search)
+        self.play(position, col)
+        self.depth_limit = depth_limit
+        self.deadline = None if time_left is None else time.perf_counter() + time_left
+        self.nodes = 0
+        try:
+            if algorithm == 'alpha_beta':
+                # the value of the position after col for the opponent, negated for the root player
+                return -self.negamax(position, 1, -np.inf, np.inf if alpha is None else -alpha)[0]
+            return self.value_expectimax(position, 1, -np.inf if alpha is None else alpha)[0]
+        except SearchTimeout:
+            return None
+        finally:
+            self.deadline = None
+
+    def reset(self, position, board, new_search=True):
+        # the only copy of the board a search makes, everything after it is changed in place
+        self.incremental_evaluator.reset(position)
+        self.board = np.array(board, dtype=np.uint8)
+        # the move ordering tables age once per search, not once per root move
+        if new_search:
+            self.move_orderer.new_search()
+
+    def iterative_deepening(self, search, position, max_depth, time_limit):
+        """
+            Iterative deepening for Alpha-beta and Expectimax:
+                a) search(previous) runs one search to self.depth_limit and returns (value, move), previous
+                   is the value to center the window on: the value of the iteration two plies shallower,
+                   since the value swings between searches that end on the root player's move and on the
+                   opponent's (None for the first two)
+                b) Without a time limit it searches straight to max_depth
+                c) With a time limit it searches to depth 1, 2, 3, ... and returns the move of the deepest
+                   search that finished before the deadline, the one the deadline interrupted is thrown away.
+                   The transposition table keeps what the shallower searches found, so every iteration
+                   starts from the previous one
+                d) It stops early once a win or a loss has been proven or the whole game has been searched
+                e) A cancelled search stops like one that ran out of time
+                f) Returns (move, principal variation), Expectimax has no variation beyond its move
+        """
+        self.nodes = 0
+        if time_limit is None:
+            self.depth_limit = max_depth
+            self.deadline = None
+            self.pv_table[0] = []
+            try:
+                move = search(None)[1]
+            except SearchTimeout:
+                # cancelled, nobody is waiting for the move anymore
+                move = position.legal_moves()[0]
+                return move, [move]
+            return move, self.pv_table[0] or [move]
+
+        self.deadline = time.perf_counter() + time_limit * TIME_BUDGET
+        # fallback in case not even the first iteration finishes
+        best_move = position.legal_moves()[0]
+        best_pv = [best_move]
+        values = [None, None]
+        for depth_limit in range(1, ROWS*COLS - position.counter + 1):
+            self.depth_limit = depth_limit
+            self.pv_table[0] = []
+            try:
+                value, move = search(values[-2])
+            except SearchTimeout:
+                # the interrupted iteration left moves on the position, the evaluator and
+                # the engine's board, all of them are rebuilt from the board on the next call
+                break
+            best_move = move
+            best_pv = self.pv_table[0] or [move]
+            values.append(value)
+            if abs(value) >= WIN_BOUND:
+                break
+        self.deadline = None
+        return best_move, best_pv
+
+    def check_deadline(self):
+        # called on every node, the clock and the cancel flag are only read every 256 nodes to keep it cheap
+        self.nodes += 1
+        if self.nodes & 255 == 0:
+            if self.deadline is not None and time.perf_counter() > self.deadline:
+                raise SearchTimeout()
+            if self.cancel is not None and self.cancel.is_set():
+                raise SearchTimeout()
+
+    def terminal_value(self, position, depth):
+        """
+            Terminal check for Alpha-beta and Expectimax:
+                a) A state is terminal when one of the players won, the board is full or the depth limit is reached
+                b) Only the player who made the last move can have won the game
+                c) A won or lost game is worth more than any heuristic value, and a quicker win is worth more
+                   than a slower one, so the search doesn't walk into a loss it could have blocked
+                d) Returns None when the state is not terminal
+        """
+        if self.last_move_won(position):
+            return self.win_value(position, depth)
+        if depth == self.depth_limit or position.is_full():
+            return self.evaluate(position)
+        return None
+
+    def last_move_won(self, position):
+        # a method of its own, like evaluate, so InstrumentedSearchEngine can time the win check
+        return position.last_move_won()
+
+    def win_value(self, position, depth):
+        # the value of a game the player of the last move has won
+        if position.last_player == self.player_number:
+            return WIN_SCORE - depth
+        return depth - WIN_SCORE
+
+    def evaluate(self, position):
+        if self.evaluator == 'window':
+            # kept up to date by play, so no board scan is needed
+            return self.incremental_evaluator.score(self.player_number)
+        # the board scan is only paid once per position and its mirror image
+        key = position.canonical_hash()[0]
+        value = self.evaluation_cache.get(key)
+        if value is None:
+            if len(self.evaluation_cache) >= EVALUATION_CACHE_SIZE:
+                self.evaluation_cache.clear()
+            value = self.evaluation_function(self.board)
+            self.evaluation_cache[key] = value
+        return value
+
+    def ordered_moves(self, position, depth, tt_move):
+        # legal moves only, left to right when move ordering is switched off
+        if self.move_ordering:
+            return self.move_orderer.moves(position, depth, tt_move)
+        return position.legal_moves()
+
+    def expand(self, position, depth, moves):
+        """
+        Returns (moves, values): the moves of a node and, when the 'batch' evaluator is
+        used and the node is one ply above the depth limit, the values of all its children,
+        which are all leaves, from one batched evaluation. Otherwise values is None and
+        the children are searched one by one
+        """
+        if self.evaluator != 'batch' or depth + 1 != self.depth_limit:
+            return moves, None
+        moves = list(moves)
+        boards = self.leaf_boards[:len(moves)]
+        boards[:] = self.board
+        values = [None] * len(moves)
+        for i, col in enumerate(moves):
+            # the child's disc lands on the row above the column's height
+            bit = position.heights[col]
+            boards[i, ROWS - 1 - bit % HEIGHT, col] = position.to_move
+            position.play(col)
+            values[i] = self.batch_leaf(position, depth+1)
+            position.undo()
+        scores = self.batch_evaluate(boards)
+        return moves, [int(score) if value is None else value for value, score in zip(values, scores)]
+
+    def batch_leaf(self, position, depth):
+        """
+        Visits one leaf of expand without searching it: the leaf still counts as a node,
+        and a won game is not a heuristic value. Returns the value of a won game, or
+        None when the leaf is left to batch_evaluate
+        """
+        self.check_deadline()
+        if self.last_move_won(position):
+            return self.win_value(position, depth)
+        return None
+
+    def batch_evaluate(self, boards):
+        # the heuristic of every board of the (n, 6, 7) stack, from one numpy call
+        return window_scores(boards, self.player_number)
+
+    def play(self, position, col):
+        # makes the move in place and updates the windows, or the numpy board, with the new disc
+        position.play(col)
+        if self.evaluator == 'window':
+            self.incremental_evaluator.place(position.heights[col]-1, position.last_player)
+        else:
+            self.board[ROWS - position.heights[col] % HEIGHT, col] = position.last_player
+
+    def undo(self, position):
+        col = position.moves[-1]
+        if self.evaluator == 'window':
+            self.incremental_evaluator.remove(position.heights[col]-1, position.last_player)
+        else:
+            self.board[ROWS - position.heights[col] % HEIGHT, col] = 0
+        position.undo()
+
+    def to_table(self, value, depth):
+        # win and loss values count plies from the root, the table stores them counted
+        # from the position itself so they stay right when it is reached at another depth
+        if value >= WIN_BOUND: return value + depth
+        if value <= -WIN_BOUND: return value - depth
+        return value
+
+    def from_table(self, value, depth):
+        if value >= WIN_BOUND: return value - depth
+        if value <= -WIN_BOUND: return value + depth
+        return value
+
+    def aspiration_search(self, position, previous):
+        """
+        Root of the Alpha-beta search: searches a narrow window around previous, the value
+        of an earlier iteration, and widens only the side the value falls out of
+        """
+        if previous is None or abs(previous) >= WIN_BOUND:
+            return self.negamax(position, 0, -np.inf, np.inf)
+        alpha, beta = previous - ASPIRATION_WINDOW, previous + ASPIRATION_WINDOW
+        while True:
+            value, move = self.negamax(position, 0, alpha, beta)
+            if value <= alpha:
+                alpha = -np.inf
+            elif value >= beta:
+                beta = np.inf
+            else:
+                return value, move
+
+    def negamax(self, position, depth, alpha, beta):
+        """
+            Alpha-beta as negamax with principal variation search:
+                a) Values are from the view of the player to move, and a successor's value is negated for
+                   its parent, so the same code serves both players. The evaluation is from the root
+                   player's view, so it is negated on odd depths
+                b) The first move, the most likely best one, is searched with the full window. Every other
+                   move is searched with the null window (alpha, alpha + 1), which only proves that it is no
+                   better. A move that turns out better after all is searched again with the full window
+                c) Nodes searched with a full window make up the principal variation: they record it in
+                   pv_table and don't stop at transposition table values, so it is never cut short
+        """
+        self.check_deadline()
+        pv_node = beta - alpha > 1
+        if pv_node:
+            self.pv_table[depth] = []
+        sign = 1 if depth%2 == 0 else -1
+        # if the state is a terminal state (when the value reached the maximum depth or winning states met)
+        # return the state's utiltiy
+        utility = self.terminal_value(position, depth)
+        if utility is not None:
+            return sign * utility, None
+        # if this position was already searched at least as deep, through another
+        # move order or on an earlier turn, reuse the value when its bound allows it
+        remaining = self.depth_limit - depth
+        key, mirrored = position.canonical_hash()
+        entry = self.transposition_table.lookup(key)
+        tt_move = None
+        if entry is not None:
+            # too shallow to answer, its best move is still the best first guess
+            tt_move = mirror_move(entry[3], mirrored)
+            if entry[1] >= remaining and not pv_node:
+                value = self.from_table(entry[0], depth)
+                if (entry[2] == EXACT or (entry[2] == LOWER and value >= beta) or
+                        (entry[2] == UPPER and value <= alpha)):
+                    return value, tt_move
+        original_alpha = alpha
+        v = -np.inf
+        move = None
+        # for each successor of state, best candidates first:
+        moves, leaf_values = self.expand(position, depth, self.ordered_moves(position, depth, tt_move))
+        for i, col in enumerate(moves):
+            if leaf_values is not None:
+                value = sign * leaf_values[i]
+                if pv_node:
+                    self.pv_table[depth+1] = []
+            else:
+                self.play(position, col)
+                if i == 0:
+                    value = -self.negamax(position, depth+1, -beta, -alpha)[0]
+                else:
+                    value = -self.negamax(position, depth+1, -alpha-1, -alpha)[0]
+                    if alpha < value < beta:
+                        value = -self.negamax(position, depth+1, -beta, -alpha)[0]
+                self.undo(position)
+            if value > v:
+                v, move = value, col
+            if v >= beta:
+                self.move_orderer.record_cutoff(position, col, depth, remaining)
+                break
+            if v > alpha:
+                alpha = v
+                if pv_node:
+                    self.pv_table[depth] = [col] + self.pv_table[depth+1]
+        # a value outside of the window is only a bound on the real value
+        if v <= original_alpha: flag = UPPER
+        elif v >= beta: flag = LOWER
+        else: flag = EXACT
+        self.transposition_table.store(key, self.to_table(v, depth), remaining, flag, mirror_move(move, mirrored))
+        return v, move
+
+    # dispatcher
+    def value_expectimax(self, position, depth, alpha=-np.inf, beta=np.inf):
+        self.check_deadline()
+        # if the state is a terminal state (when the value reached the maximum depth or winning states met)
+        # return the state's utiltiy
+        utility = self.terminal_value(position, depth)
+        if utility is not None:
+            return utility, None
+        # expectimax entries share the table under a different key, with the same bounds as alpha-beta
+        remaining = self.depth_limit - depth
+        key, mirrored = position.canonical_hash()
+        key ^= EXPECTIMAX_KEY
+        entry = self.transposition_table.lookup(key)
+        tt_move = None
+        if entry is not None:
+            tt_move = mirror_move(entry[3], mirrored)
+            if entry[1] >= remaining:
+                value = self.from_table(entry[0], depth)
+                if (entry[2] == EXACT or (entry[2] == LOWER and value >= beta) or
+                        (entry[2] == UPPER and value <= alpha)):
+                    return value, tt_move
+        # MAX on even depths, EXP on odd depths
+        if depth%2 == 0:
+            v, move = self.expectimax_max_value(position, depth, alpha, beta, tt_move)
+        else:
+            v, move = self.exp_value(position, depth, alpha, beta)
+        if v <= alpha: flag = UPPER
+        elif v >= beta: flag = LOWER
+        else: flag = EXACT
+        self.transposition_table.store(key, self.to_table(v, depth), remaining, flag, mirror_move(move, mirrored))
+        return v, move
+
+    def expectimax_max_value(self, position, depth, alpha, beta, tt_move):
+        # initialize v to -inf
+        v = -np.inf
+        move = 0
+        # for each successor of state, best candidates first:
+        moves, leaf_values = self.expand(position, depth, self.ordered_moves(position, depth, tt_move))
+        for i, col in enumerate(moves):
+            if leaf_values is None:
+                self.play(position, col)
+                value = self.value_expectimax(position, depth+1, alpha, beta)[0]
+                self.undo(position)
+            else:
+                value = leaf_values[i]
+            if value > v:
+                v, move = value, col
+            if v >= beta:
+                self.move_orderer.record_cutoff(position, col, depth, self.depth_limit - depth)
+                return v, col
+            alpha = max(alpha, v)
+        return v, move
+
+    def exp_value(self, position, depth, alpha, beta):
+        """
+            Chance node of Expectimax, the random player picks each legal move with equal probability:
+                a) The value is the average of the successors' values, 1/n each
+                b) Every value lies within [MIN_VALUE, MAX_VALUE], so before a successor is searched the
+                   average is known to lie between the sum so far plus the lowest and plus the highest values
+                   the remaining successors can have. The successor is searched with the window that keeps
+                   the average inside (alpha, beta), and if it falls outside the node is cut off (Star1)
+                c) A Star1 cutoff is recorded like a beta cutoff, for the move ordering and the stats
+                d) A chance node has no best move, it returns None
+        """
+        moves, leaf_values = self.expand(position, depth, list(self.ordered_moves(position, depth, None)))
+        n = len(moves)
+        total = 0
+        for i, col in enumerate(moves):
+            rest = n - 1 - i
+            child_alpha = n * alpha - total - MAX_VALUE * rest
+            child_beta = n * beta - total - MIN_VALUE * rest
+            if leaf_values is None:
+                self.play(position, col)
+                value = self.value_expectimax(position, depth+1, child_alpha, child_beta)[0]
+                self.undo(position)
+            else:
+                value = leaf_values[i]
+            if value <= child_alpha:
+                # even if the rest are as good as they can be, the average stays below alpha
+                self.move_orderer.record_cutoff(position, col, depth, self.depth_limit - depth)
+                return (total + value + MAX_VALUE * rest) / n, None
+            if value >= child_beta:
+                # even if the rest are as bad as they can be, the average stays above beta
+                self.move_orderer.record_cutoff(position, col, depth, self.depth_limit - depth)
+                return (total + value + MIN_VALUE * rest) / n, None
+            total += value
+        return total / n, None
@@ -0,0 +1,220 @@
+"""
+Exact endgame solver for AIPlayer
+
+Near the end of a game the tree is small enough to be searched to the end,
+so instead of a heuristic value the solver returns the proven outcome of
+the position under perfect play.
+
+Score:
+    0 for a draw, positive if the player to move wins, negative if it loses.
+    A win with the player's k-th disc scores 22 - k, so a quicker win is
+    worth more and a later loss costs less. outcome turns a score into
+    ('win' / 'loss' / 'draw', number of plies until the game ends).
+
+Search:
+    negamax over the raw bitmasks of the position (the layout of Bitboard.py):
+        a) before a node is searched, the player to move is known not to have
+           a winning move, the parent checks that once for all of its children
+        b) moves that hand the opponent a win are never tried, if the opponent
+           threatens to win the move blocking it is the only one tried, and if
+           it threatens twice the node is lost
+        c) the score is bounded by how soon the game can still end, which
+           narrows the window before any child is searched
+        d) children are tried by how many new threats the move creates,
+           center-first on ties
+        e) bounds are kept in a TranspositionTable under the exact key of the
+           position, so it never mixes up two positions
+    solve narrows the score down with null-window searches, each of which
+    only has to tell whether the score is above or below one value and so
+    prunes far more than a search with a wide window.
+"""
+
+import time
+
+from Bitboard import BOTTOM_MASK, COLS, HEIGHT, ROWS
+from MoveOrdering import CENTER_ORDER
+from Search import SearchTimeout
+from TranspositionTable import LOWER, UPPER, TranspositionTable
+
+# the solver takes over from the heuristic search once this few cells are empty
+SOLVER_THRESHOLD = 20
+CELLS = ROWS * COLS
+# every playable cell, sentinels excluded
+BOARD_MASK = BOTTOM_MASK * ((1 << ROWS) - 1)
+COLUMN_MASKS = [((1 << ROWS) - 1) << (col * HEIGHT) for col in CENTER_ORDER]
+
+
+def winning_cells(current, mask):
+    """
+    Returns the empty cells that would complete four in a row for the discs in current
+    """
+    # vertical
+    cells = (current << 1) & (current << 2) & (current << 3)
+    # horizontal and the two diagonals, the new disc can be anywhere in the line
+    for shift in (HEIGHT, HEIGHT - 1, HEIGHT + 1):
+        pairs = (current << shift) & (current << 2 * shift)
+        cells |= pairs & (current << 3 * shift)
+        cells |= pairs & (current >> shift)
+        pairs = (current >> shift) & (current >> 2 * shift)
+        cells |= pairs & (current << shift)
+        cells |= pairs & (current >> 3 * shift)
+    return cells & (BOARD_MASK ^ mask)
+
+
+def playable_cells(mask):
+    # the lowest empty cell of every column that is not full
+    return (mask + BOTTOM_MASK) & BOARD_MASK
+
+
+def non_losing_moves(current, mask):
+    """
+    Returns the playable cells after which the opponent cannot win right away
+    """
+    playable = playable_cells(mask)
+    opponent_wins = winning_cells(current ^ mask, mask)
+    forced = playable & opponent_wins
+    if forced:
+        if forced & (forced - 1):
+            # two threats, only one can be blocked
+            return 0
+        playable = forced
+    # never play right below a cell where the opponent would win
+    return playable & ~(opponent_wins >> 1)
+
+
+def outcome(score, counter):
+    """
+    Returns ('win' / 'loss' / 'draw', plies until the game ends) of a score
+    for the player to move on a board with counter discs
+    """
+    if score == 0:
+        return 'draw', CELLS - counter
+    # the winning disc is the (22 - |score|)-th disc of the winner, which is
+    # dropped on a board with `before` discs
+    before = CELLS - 2 * abs(score)
+    winner_parity = counter & 1 if score > 0 else 1 - (counter & 1)
+    if before & 1 != winner_parity:
+        before += 1
+    return ('win' if score > 0 else 'loss'), before - counter + 1
+
+
+class Solver:
+    """
+    This class solves Connect Four positions exactly.
+    It has the following instance level attributes:
+
+    transposition_table: bounds of solved positions, kept between moves
+    deadline: time.perf_counter() value the search has to stop at, or None
+    cancel: an object whose is_set() turns True when the search has to stop early, or None
+    nodes: number of nodes visited by the last solve
+    """
+    def __init__(self, table_size=1 << 18):
+        # the keys are exact positions, not Zobrist hashes, so they are mixed to spread over the buckets
+        self.transposition_table = TranspositionTable(table_size, mix_keys=True)
+        self.deadline = None
+        self.cancel = None
+        self.nodes = 0
+
+    def negamax(self, current, mask, counter, alpha, beta):
+        """
+        Returns the score of the position if it lies within (alpha, beta), otherwise a
+        bound on the same side of the window. current holds the discs of the player to
+        move, who must not have a winning move
+        """
+        self.nodes += 1
+        if self.nodes & 1023 == 0:
+            if self.deadline is not None and time.perf_counter() > self.deadline:
+                raise SearchTimeout()
+            if self.cancel is not None and self.cancel.is_set():
+                raise SearchTimeout()
+        moves = non_losing_moves(current, mask)
+        if not moves:
+            # whatever is played, the opponent wins with its next disc
+            return -((CELLS - counter) // 2)
+        if counter >= CELLS - 2:
+            # neither player can win with the last two discs
+            return 0
+        # the opponent cannot win with its next disc, nor the player to move with this one
+        low = -((CELLS - 2 - counter) // 2)
+        high = (CELLS - 1 - counter) // 2
+        key = current + mask + BOTTOM_MASK
+        entry = self.transposition_table.lookup(key)
+        if entry is not None:
+            if entry[2] == UPPER:
+                high = min(high, entry[0])
+            else:
+                low = max(low, entry[0])
+        alpha = max(alpha, low)
+        beta = min(beta, high)
+        if alpha >= beta:
+            return alpha
+        # moves that create the most new threats first, center-first on ties
+        candidates = []
+        for column in COLUMN_MASKS:
+            move = moves & column
+            if move:
+                candidates.append((-winning_cells(current | move, mask).bit_count(), len(candidates), move))
+        candidates.sort()
+        opponent = current ^ mask
+        remaining = CELLS - counter
+        for threats, order, move in candidates:
+            value = -self.negamax(opponent, mask | move, counter + 1, -beta, -alpha)
+            if value >= beta:
+                self.transposition_table.store(key, value, remaining, LOWER, None)
+                return value
+            if value > alpha:
+                alpha = value
+        self.transposition_table.store(key, alpha, remaining, UPPER, None)
+        return alpha
+
+    def solve(self, current, mask, counter):
+        """
+        Returns the exact score of a position, where current holds the discs of the player to move
+        """
+        if winning_cells(current, mask) & playable_cells(mask):
+            return (CELLS + 1 - counter) // 2
+        low = -((CELLS - counter) // 2)
+        high = (CELLS + 1 - counter) // 2
+        while low < high:
+            # the null window is moved toward 0 first, where most positions are decided
+            middle = low + (high - low) // 2
+            if middle <= 0 and int(low / 2) < middle:
+                middle = int(low / 2)
+            elif middle >= 0 and high // 2 > middle:
+                middle = high // 2
+            value = self.negamax(current, mask, counter, middle, middle + 1)
+            if value <= middle:
+                high = value
+            else:
+                low = value
+        return low
+
+    def best_move(self, position, time_limit=None):
+        """
+        Returns (move, score) of the best move of a Bitboard position, or None if the
+        solver did not finish within time_limit seconds
+        """
+        self.nodes = 0
+        self.deadline = None if time_limit is None else time.perf_counter() + time_limit
+        current = position.boards[position.counter & 1]
+        mask = position.mask
+        counter = position.counter
+        try:
+            playable = playable_cells(mask)
+            wins = winning_cells(current, mask) & playable
+            for col, column in zip(CENTER_ORDER, COLUMN_MASKS):
+                if wins & column:
+                    return col, (CELLS + 1 - counter) // 2
+            score = self.solve(current, mask, counter)
+            moves = non_losing_moves(current, mask)
+            for col, column in zip(CENTER_ORDER, COLUMN_MASKS):
+                move = moves & column
+                # the move is as good as the position if the child is at most -score
+                if move and self.negamax(current ^ mask, mask | move, counter + 1, -score, -score + 1) <= -score:
+                    return col, score
+            # every move loses right away
+            return next(col for col, column in zip(CENTER_ORDER, COLUMN_MASKS) if playable & column), score
+        except SearchTimeout:
+            return None
+        finally:
+            self.deadline = None
@@ -0,0 +1,189 @@
+"""
+Headless Connect Four games and batch tournaments
+
+HeadlessGame plays the same rules as the Game GUI in ConnectFour.py, but
+without Tkinter and without waiting for 'Next Move' clicks, so it runs on a
+machine with no display. run_tournament plays N games between two agents
+across a pool of processes and reports win / loss / draw rates, moves per
+game and time per move.
+
+To run a tournament, write the following command in terminal after locating to the path of the file:
+
+    python Tournament.py ai random --games 100 --processes 4 --output results.json
+
+where the players could be ai or random, and the output is written as JSON,
+or as one CSV row per game if the file name ends with .csv
+"""
+
+# system libs
+import argparse
+import csv
+import json
+import multiprocessing as mp
+import time
+
+# 3rd party libs
+import numpy as np
+
+# Local libs
+from Bitboard import COLS, ROWS
+from GameState import GameState
+from Player import AIPlayer, RandomPlayer
+from Search import EVALUATORS
+
+PLAYER_TYPES = ['ai', 'random']
+
+
+def make_player(name, num, time_limit=None, depth=3, evaluator='window'):
+    if name=='ai':
+        player = AIPlayer(num, evaluator, time_limit=time_limit)
+        player.maxDepth = depth
+        return player
+    elif name=='random':
+        return RandomPlayer(num)
+    raise ValueError('Unknown player type {}'.format(name))
+
+
+class HeadlessGame:
+    """
+    This class plays one game between two player objects without a GUI.
+    It has the following instance level attributes:
+
+    players: [player 1, player 2], player 1 moves first
+    state: the GameState of the game
+    board: the 6x7 numpy board, encoded like in Game
+    move_times: seconds every move took, per player
+    """
+    def __init__(self, player1, player2):
+        self.players = [player1, player2]
+        self.state = GameState()
+        self.board = self.state.board
+        self.current_turn = 0
+        self.moves = 0
+        self.move_times = [[], []]
+
+    def get_move(self, turn):
+        player = self.players[turn]
+        if player.type == 'ai':
+            # same choice of algorithm as Game.make_move
+            if self.players[int(not turn)].type == 'random':
+                return player.get_expectimax_move(self.board, self.state)
+            return player.get_alpha_beta_move(self.board, self.state)
+        return player.get_move(self.board, self.state)
+
+    def update_board(self, move, player_num):
+        if not self.state.can_play(move):
+            raise Exception('Invalid move by player {}. Column {}'.format(player_num, move))
+        return self.state.play(move)
+
+    def play(self):
+        """
+        Plays the game to the end, returns the number of the winning player or 0 for a draw
+        """
+        while self.moves < ROWS * COLS:
+            player = self.players[self.current_turn]
+            start = time.perf_counter()
+            move = int(self.get_move(self.current_turn))
+            self.move_times[self.current_turn].append(time.perf_counter() - start)
+            self.update_board(move, player.player_number)
+            self.moves += 1
+            if self.state.last_move_won():
+                return player.player_number
+            self.current_turn = int(not self.current_turn)
+        return 0
+
+
+def play_one_game(args):
+    """
+    Runs in a pool process: plays game number index and returns its result row
+    """
+    index, player1, player2, swap, time_limit, depth, evaluator, seed = args
+    # every game gets its own, reproducible random numbers
+    np.random.seed(seed + index)
+    names = [player1, player2]
+    # with swap, the agents take turns at moving first
+    first = 1 if swap and index % 2 else 0
+    players = [make_player(names[first], 1, time_limit, depth, evaluator),
+               make_player(names[1 - first], 2, time_limit, depth, evaluator)]
+    game = HeadlessGame(*players)
+    winner = game.play()
+    # results are reported per agent (player1 / player2 of the command line), not per seat
+    agent_times = [game.move_times[0], game.move_times[1]] if first == 0 else [game.move_times[1], game.move_times[0]]
+    winner_agent = 0 if winner == 0 else (winner if first == 0 else 3 - winner)
+    for player in players:
+        if player.type == 'ai':
+            player.close()
+    return {
+        'game': index,
+        'first': first + 1,
+        'winner': winner_agent,
+        'moves': game.moves,
+        'player1_moves': len(agent_times[0]),
+        'player1_time': sum(agent_times[0]),
+        'player1_max_move_time': max(agent_times[0], default=0.0),
+        'player2_moves': len(agent_times[1]),
+        'player2_time': sum(agent_times[1]),
+        'player2_max_move_time': max(agent_times[1], default=0.0),
+    }
+
+
+def summarize(player1, player2, results):
+    games = len(results)
+    summary = {'player1': player1, 'player2': player2, 'games': games}
+    for agent in (1, 2):
+        moves = sum(r['player{}_moves'.format(agent)] for r in results)
+        total = sum(r['player{}_time'.format(agent)] for r in results)
+        summary['player{}_win_rate'.format(agent)] = sum(r['winner'] == agent for r in results) / games
+        summary['player{}_time_per_move'.format(agent)] = total / moves if moves else 0.0
+        summary['player{}_max_move_time'.format(agent)] = max(r['player{}_max_move_time'.format(agent)] for r in results)
+    summary['draw_rate'] = sum(r['winner'] == 0 for r in results) / games
+    summary['moves_per_game'] = sum(r['moves'] for r in results) / games
+    return summary
+
+
+def run_tournament(player1, player2, games, processes=1, swap=True, time_limit=None, depth=3,
+                   evaluator='window', seed=0):
+    """
+    Plays games between player1 and player2 (strings from PLAYER_TYPES) across
+    processes, returns (summary, list of per game results)
+    """
+    tasks = [(index, player1, player2, swap, time_limit, depth, evaluator, seed) for index in range(games)]
+    if processes > 1:
+        with mp.Pool(processes) as pool:
+            results = pool.map(play_one_game, tasks)
+    else:
+        results = [play_one_game(task) for task in tasks]
+    return summarize(player1, player2, results), results
+
+
+def write_results(path, summary, results):
+    if path.endswith('.csv'):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        with open(path, 'w') as f:
+            json.dump({'summary': summary, 'games': results}, f, indent=2)
+
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('player1', choices=PLAYER_TYPES)
+    parser.add_argument('player2', choices=PLAYER_TYPES)
+    parser.add_argument('--games', type=int, default=100, help='Number of games to play (int)')
+    parser.add_argument('--processes', type=int, default=1, help='Games played at the same time (int)')
+    parser.add_argument('--no-swap', action='store_true', help='Always let player1 move first')
+    parser.add_argument('--time', type=float, default=None,
+                        help='Seconds an ai player may think about a move, fixed depth if not set')
+    parser.add_argument('--depth', type=int, default=3, help='Search depth of the ai players without --time (int)')
+    parser.add_argument('--evaluator', choices=EVALUATORS, default='window', help='Heuristic used by the ai players')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random players (int)')
+    parser.add_argument('--output', default=None, help='File to write the results to (.json or .csv)')
+    args = parser.parse_args()
+
+    summary, results = run_tournament(args.player1, args.player2, args.games, args.processes,
+                                      not args.no_swap, args.time, args.depth, args.evaluator, args.seed)
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        write_results(args.output, summary, results)
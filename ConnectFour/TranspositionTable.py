@@ -0,0 +1,110 @@
+"""
+Transposition table for the Connect Four search
+
+Entries:
+    Every entry holds the Zobrist hash of a position, the value found for it,
+    the remaining depth it was searched to, whether that value is EXACT or only
+    a LOWER / UPPER bound (the search failed high / low), and the best move.
+    The search stores positions under their canonical hash, so one entry
+    answers for a position and its mirror image.
+
+Replacement policy (two-tier):
+    The table has `size` buckets of two slots. The first slot keeps the entry
+    searched to the greatest depth, the second one always takes the newest
+    entry that did not make it into the first one. Deep results survive while
+    the many shallow ones near the leaves still get cached.
+
+Keys:
+    The search's keys are Zobrist hashes, whose low bits are already random, so
+    they pick their bucket by a mask. A table made with mix_keys=True takes
+    other keys, like the exact position keys of the Solver, whose low bits
+    follow the layout of the board and would crowd into a few buckets. It
+    multiplies them by a 64 bit odd constant (Fibonacci hashing) and picks the
+    bucket by the top bits of the product.
+
+Counters:
+    hits       lookups that found the position
+    misses     lookups that did not find the position
+    collisions misses where the bucket was full of other positions
+    stores     entries written
+    These are meant for tuning `size` against memory.
+"""
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# 2**64 divided by the golden ratio, the multiplier of mixed keys
+MIX_MULTIPLIER = 0x9E3779B97F4A7C15
+MASK_64 = (1 << 64) - 1
+
+
+class TranspositionTable:
+    def __init__(self, size=1 << 16, mix_keys=False):
+        # round the number of buckets up to a power of two so a mask picks the bucket
+        self.size = 1 << max(size - 1, 0).bit_length()
+        self.mask = self.size - 1
+        self.mix_keys = mix_keys
+        # the top bits of a 64 bit product that pick the bucket of a mixed key
+        self.shift = 64 - (self.size.bit_length() - 1)
+        self.clear()
+
+    def clear(self):
+        slots = 2 * self.size
+        self.keys = [None] * slots
+        self.values = [0] * slots
+        self.depths = [0] * slots
+        self.flags = [EXACT] * slots
+        self.moves = [None] * slots
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def lookup(self, key):
+        """
+        Returns (value, depth, flag, move) stored for key, or None
+        """
+        if self.mix_keys:
+            slot = ((key * MIX_MULTIPLIER & MASK_64) >> self.shift) << 1
+        else:
+            slot = (key & self.mask) << 1
+        keys = self.keys
+        if keys[slot] != key:
+            slot += 1
+            if keys[slot] != key:
+                self.misses += 1
+                if keys[slot] is not None and keys[slot - 1] is not None:
+                    self.collisions += 1
+                return None
+        self.hits += 1
+        return self.values[slot], self.depths[slot], self.flags[slot], self.moves[slot]
+
+    def store(self, key, value, depth, flag, move):
+        if self.mix_keys:
+            slot = ((key * MIX_MULTIPLIER & MASK_64) >> self.shift) << 1
+        else:
+            slot = (key & self.mask) << 1
+        keys = self.keys
+        # the depth-preferred slot takes the entry if it is as deep or the same position,
+        # otherwise the always-replace slot does
+        if keys[slot] is not None and keys[slot] != key and self.depths[slot] > depth:
+            slot += 1
+        keys[slot] = key
+        self.values[slot] = value
+        self.depths[slot] = depth
+        self.flags[slot] = flag
+        self.moves[slot] = move
+        self.stores += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': self.size,
+            'filled': 2 * self.size - self.keys.count(None),
+            'hits': self.hits,
+            'misses': self.misses,
+            'collisions': self.collisions,
+            'stores': self.stores,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,116 @@
+"""
+Long-lived worker process for an AI player
+
+Game used to start a new process for every AI move, which pickled the board
+and the player each time and threw away everything the search had learned.
+An AIWorker starts one process per AI player for the whole game instead. The
+player object lives in that process, so its transposition table, history
+table and process pool carry over from one move to the next.
+
+Requests and answers go over a Pipe and carry a request id. Every request
+also carries the time.time() deadline the caller waits until. When the caller
+gives up, it writes the id of the request to a shared value, which the search
+checks along with its own deadline (see SearchEngine.check_deadline) and stops
+at, so the worker is free for the next request at once. A request whose
+deadline passed while the worker was still busy is dropped unanswered, and
+an answer that comes in after the caller gave up is recognised by its old id
+and dropped.
+"""
+
+# system libs
+import multiprocessing as mp
+import time
+import traceback
+
+
+class RequestCancel:
+    """
+    This class tells the search of one request to stop.
+    is_set() turns True once the caller gave up on the request, or its deadline passed
+    """
+    def __init__(self, cancelled, request_id, deadline):
+        self.cancelled = cancelled
+        self.request_id = request_id
+        self.deadline = deadline
+
+    def is_set(self):
+        if self.cancelled.value >= self.request_id:
+            return True
+        return self.deadline is not None and time.time() > self.deadline
+
+
+def worker_loop(player, conn, cancelled):
+    """
+    Runs in the worker process: answers (request_id, algorithm, board, state, deadline) requests
+    with (request_id, move, error) until it receives None. cancelled holds the id of the
+    last request the caller gave up on
+    """
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        request_id, algorithm, board, state, deadline = request
+        cancel = RequestCancel(cancelled, request_id, deadline)
+        if cancel.is_set():
+            # the caller gave up on it while an earlier request was being searched
+            continue
+        player.set_cancel(cancel)
+        try:
+            if algorithm == 'alpha_beta':
+                move = player.get_alpha_beta_move(board, state)
+            else:
+                move = player.get_expectimax_move(board, state)
+            conn.send((request_id, move, None))
+        except Exception:
+            conn.send((request_id, None, traceback.format_exc()))
+    player.close()
+    conn.close()
+
+
+class AIWorker:
+    """
+    This class runs the searches of one AIPlayer in a process of its own.
+    It has the following instance level attributes:
+
+    player: the AIPlayer, the worker process has its own copy of it
+    request_id: id of the latest request
+    cancelled: id of the last request the caller gave up on, shared with the worker process
+    """
+    def __init__(self, player):
+        self.player = player
+        self.request_id = 0
+        self.cancelled = mp.Value('l', 0, lock=False)
+        self.conn, child_conn = mp.Pipe()
+        # not a daemon, so a player with workers > 1 can start its process pool in it
+        self.process = mp.Process(target=worker_loop, args=(player, child_conn, self.cancelled))
+        self.process.start()
+
+    def get_move(self, board, algorithm, timeout=None, state=None):
+        """
+        Asks the worker for a move with algorithm ('alpha_beta' or 'expectimax')
+        on the board, and its GameState if there is one,
+        returns None if no answer came within timeout seconds, the search is then cancelled
+        """
+        self.request_id += 1
+        # wall-clock time, so the worker process can compare it with its own clock
+        deadline = None if timeout is None else time.time() + timeout
+        self.conn.send((self.request_id, algorithm, board, state, deadline))
+        while True:
+            remaining = None if deadline is None else max(deadline - time.time(), 0)
+            if not self.conn.poll(remaining):
+                self.cancelled.value = self.request_id
+                return None
+            request_id, move, error = self.conn.recv()
+            if request_id != self.request_id:
+                # the late answer to a request we already gave up on
+                continue
+            if error is not None:
+                raise Exception(error)
+            return move
+
+    def close(self):
+        if self.process.is_alive():
+            self.conn.send(None)
+            self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()